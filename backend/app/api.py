@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from typing import List
-from supabase import Client
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status, UploadFile, File, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
 import secrets
 import uuid
 
-from . import services, schemas
+from . import services, schemas, uploads, images, catalog_import, reservations
 from .config import settings
-from .supabase_client import get_supabase_client
+from .supabase_client import SupabaseClient, get_supabase
+from .responses import cached_json_response, json_response, threadpool_json_response
+from .search import search_index
+from .tokens import token_generation
+from .events import catalog_events, sse_stream
 
 
 router = APIRouter(prefix="/api")
@@ -14,9 +18,14 @@ admin_router = APIRouter(
     prefix="/api/admin",
     dependencies=[Depends(services.get_current_admin_user)],
 )
+upload_router = APIRouter(
+    prefix="/api/admin",
+    dependencies=[Depends(services.get_current_admin_user)],
+    route_class=uploads.ImageUploadRoute,
+)
 
 @router.post("/login", response_model=schemas.Token, tags=["Authentication"])
-def login_for_access_token(form_data: schemas.AdminLoginRequest):
+async def login_for_access_token(form_data: schemas.AdminLoginRequest, supabase: SupabaseClient = Depends(get_supabase)):
     is_valid_password = secrets.compare_digest(form_data.password, settings.AZHAR_ADMIN_INITIAL_PASSWORD)
     if not is_valid_password:
         raise HTTPException(
@@ -24,126 +33,296 @@ def login_for_access_token(form_data: schemas.AdminLoginRequest):
             detail="Incorrect password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = services.create_access_token(data={"sub": "admin"})
+    generation = await token_generation.current(supabase)
+    access_token = services.create_access_token(data={"sub": "admin"}, generation=generation)
     return {"access_token": access_token, "token_type": "bearer"}
 
+@admin_router.post("/logout", status_code=status.HTTP_204_NO_CONTENT, tags=["Authentication"])
+async def logout(supabase: SupabaseClient = Depends(get_supabase)):
+    await token_generation.bump(supabase)
+
+def parse_product_fields(fields: Optional[str]) -> frozenset[str]:
+    if fields is None:
+        return schemas.DEFAULT_PRODUCT_FIELDS
+    requested = frozenset(field.strip() for field in fields.split(",") if field.strip())
+    unknown = requested - schemas.PRODUCT_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+    return requested
+
 @router.get("/products", response_model=List[schemas.Product], tags=["Products"])
-def list_products(supabase: Client = Depends(get_supabase_client)):
-    return services.get_products(supabase=supabase)
+async def list_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=settings.PRODUCTS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: Optional[bool] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated: category, images, primary_image, variants"),
+    supabase: SupabaseClient = Depends(get_supabase),
+):
+    query = schemas.ProductQuery(
+        limit=limit,
+        after_id=services.decode_cursor(cursor) if cursor else None,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        fields=parse_product_fields(fields),
+    )
+
+    async def load():
+        products, next_cursor = await services.get_product_page(query=query, supabase=supabase)
+        return products, {"X-Next-Cursor": next_cursor} if next_cursor is not None else {}
+
+    return await cached_json_response(request, ("products", query), List[schemas.Product], load)
 
 @router.get("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
-def get_product(product_id: int, supabase: Client = Depends(get_supabase_client)):
-    db_product = services.get_product(product_id=product_id, supabase=supabase)
-    if db_product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return db_product
+async def get_product(request: Request, product_id: int, supabase: SupabaseClient = Depends(get_supabase)):
+    async def load():
+        db_product = await services.get_product(product_id=product_id, supabase=supabase)
+        if db_product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return db_product, {}
+
+    return await cached_json_response(request, ("product", product_id), schemas.Product, load)
+
+@router.get("/search", response_model=List[schemas.Product], tags=["Products"])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=settings.SEARCH_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated: category, images, primary_image, variants"),
+    supabase: SupabaseClient = Depends(get_supabase),
+):
+    if not search_index.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search index is not ready",
+            headers={"Retry-After": "5"},
+        )
+    offset = services.decode_cursor(cursor) if cursor else 0
+    total, product_ids = search_index.search(q, limit, offset)
+    products = await services.get_products_by_ids(product_ids, parse_product_fields(fields), supabase=supabase)
+
+    response = json_response(products, List[schemas.Product])
+    response.headers["X-Total-Count"] = str(total)
+    if offset + limit < total:
+        response.headers["X-Next-Cursor"] = services.encode_cursor(offset + limit)
+    return response
+
+@router.get("/catalog/stream", tags=["Catalog"])
+async def catalog_stream(
+    after: Optional[str] = Query(None, description="Resume after this event id"),
+    last_event_id: Optional[str] = Header(None),
+):
+    return StreamingResponse(
+        sse_stream(last_event_id or after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/catalog/ws")
+async def catalog_websocket(websocket: WebSocket, after: Optional[str] = None):
+    await websocket.accept()
+    try:
+        async for event in catalog_events.follow(after):
+            if event is None:
+                await websocket.send_text('{"type":"ping"}')
+            else:
+                await websocket.send_text(event.data.decode())
+    except WebSocketDisconnect:
+        pass
+
+@router.post("/checkout/cart", response_model=schemas.CartToken, status_code=status.HTTP_201_CREATED, tags=["Checkout"], dependencies=[Depends(reservations.limit_cart_minting)])
+async def create_cart():
+    return reservations.create_cart_token()
+
+@router.post("/checkout/reservations", response_model=schemas.Reservation, status_code=status.HTTP_201_CREATED, tags=["Checkout"])
+async def create_reservation(
+    request: schemas.ReservationCreate,
+    cart_id: str = Depends(reservations.get_cart_id),
+    client: Optional[str] = Depends(reservations.client_address),
+    supabase: SupabaseClient = Depends(get_supabase),
+):
+    return await reservations.reserve_stock(request, cart_id, client, supabase=supabase)
+
+@router.post("/checkout/reservations/{reservation_id}/commit", status_code=status.HTTP_204_NO_CONTENT, tags=["Checkout"])
+async def commit_reservation(reservation_id: uuid.UUID, cart_id: str = Depends(reservations.get_cart_id), supabase: SupabaseClient = Depends(get_supabase)):
+    if not await reservations.commit_reservation(reservation_id, cart_id, supabase=supabase):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Reservation is not active")
+    return None
+
+@router.delete("/checkout/reservations/{reservation_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Checkout"])
+async def release_reservation(reservation_id: uuid.UUID, cart_id: str = Depends(reservations.get_cart_id), supabase: SupabaseClient = Depends(get_supabase)):
+    if not await reservations.release_reservation(reservation_id, cart_id, supabase=supabase):
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return None
 
 @router.get("/categories", response_model=List[schemas.Category], tags=["Categories"])
-def list_categories(supabase: Client = Depends(get_supabase_client)):
-    return services.get_categories(supabase=supabase)
+async def list_categories(request: Request, supabase: SupabaseClient = Depends(get_supabase)):
+    async def load():
+        return await services.get_categories(supabase=supabase), {}
+
+    return await cached_json_response(request, ("categories",), List[schemas.Category], load)
 
 @router.get("/categories/{category_id}", response_model=schemas.Category, tags=["Categories"])
-def get_category(category_id: int, supabase: Client = Depends(get_supabase_client)):
-    db_category = services.get_category(category_id=category_id, supabase=supabase)
-    if db_category is None:
-        raise HTTPException(status_code=404, detail="Category not found")
-    return db_category
+async def get_category(request: Request, category_id: int, supabase: SupabaseClient = Depends(get_supabase)):
+    async def load():
+        db_category = await services.get_category(category_id=category_id, supabase=supabase)
+        if db_category is None:
+            raise HTTPException(status_code=404, detail="Category not found")
+        return db_category, {}
+
+    return await cached_json_response(request, ("category", category_id), schemas.Category, load)
 
 @admin_router.post("/products", response_model=schemas.Product, tags=["Admin - Products"])
-def create_product(product: schemas.ProductCreate, supabase: Client = Depends(get_supabase_client)):
-    return services.create_product(product=product, supabase=supabase)
+async def create_product(product: schemas.ProductCreate, supabase: SupabaseClient = Depends(get_supabase)):
+    return await services.create_product(product=product, supabase=supabase)
 
 @admin_router.patch("/products/{product_id}", response_model=schemas.Product, tags=["Admin - Products"])
-def update_product(product_id: int, product: schemas.ProductUpdate, supabase: Client = Depends(get_supabase_client)):
-    db_product = services.update_product(product_id=product_id, product=product, supabase=supabase)
+async def update_product(product_id: int, product: schemas.ProductUpdate, supabase: SupabaseClient = Depends(get_supabase)):
+    db_product = await services.update_product(product_id=product_id, product=product, supabase=supabase)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     return db_product
 
 @admin_router.delete("/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Admin - Products"])
-def delete_product(product_id: int, supabase: Client = Depends(get_supabase_client)):
-    success = services.delete_product(product_id=product_id, supabase=supabase)
+async def delete_product(product_id: int, supabase: SupabaseClient = Depends(get_supabase)):
+    success = await services.delete_product(product_id=product_id, supabase=supabase)
     if not success:
         raise HTTPException(status_code=404, detail="Product not found")
     return None
 
 @admin_router.post("/categories", response_model=schemas.Category, tags=["Admin - Categories"])
-def create_category(category: schemas.CategoryCreate, supabase: Client = Depends(get_supabase_client)):
-    return services.create_category(category=category, supabase=supabase)
+async def create_category(category: schemas.CategoryCreate, supabase: SupabaseClient = Depends(get_supabase)):
+    return await services.create_category(category=category, supabase=supabase)
 
 @admin_router.get("/products", response_model=List[schemas.Product], tags=["Admin - Products"])
-def admin_list_products(supabase: Client = Depends(get_supabase_client)):
-    return services.get_products(supabase=supabase)
+async def admin_list_products(supabase: SupabaseClient = Depends(get_supabase)):
+    return await threadpool_json_response(await services.get_products(supabase=supabase), schemas.Product)
 
 @admin_router.get("/categories", response_model=List[schemas.Category], tags=["Admin - Categories"])
-def admin_list_categories(supabase: Client = Depends(get_supabase_client)):
-    return services.get_categories(supabase=supabase)
+async def admin_list_categories(supabase: SupabaseClient = Depends(get_supabase)):
+    return await threadpool_json_response(await services.get_categories(supabase=supabase), schemas.Category)
 
 @admin_router.patch("/categories/{category_id}", response_model=schemas.Category, tags=["Admin - Categories"])
-def update_category(category_id: int, category: schemas.CategoryCreate, supabase: Client = Depends(get_supabase_client)):
-    db_category = services.update_category(category_id=category_id, category=category, supabase=supabase)
+async def update_category(category_id: int, category: schemas.CategoryCreate, supabase: SupabaseClient = Depends(get_supabase)):
+    db_category = await services.update_category(category_id=category_id, category=category, supabase=supabase)
     if db_category is None:
         raise HTTPException(status_code=404, detail="Category not found")
     return db_category
 
-@admin_router.post("/products/{product_id}/images", response_model=schemas.ProductImage, tags=["Admin - Products"])
-def upload_product_image(product_id: int, file: UploadFile = File(...), supabase: Client = Depends(get_supabase_client)):
-    file_path = f"{product_id}/{uuid.uuid4()}{file.filename}"
-    try:
-        file_content = file.file.read()
-        supabase.storage.from_("products").upload(file_path, file_content)
-        image_url = supabase.storage.from_("products").get_public_url(file_path)
-        return services.create_product_image(product_id=product_id, image_url=image_url, supabase=supabase)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@upload_router.post("/products/{product_id}/images", response_model=schemas.ProductImage, tags=["Admin - Products"])
+async def upload_product_image(product_id: int, file: UploadFile = File(...), supabase: SupabaseClient = Depends(get_supabase)):
+    stored = await uploads.store_image(supabase, file, prefix=str(product_id))
+    derivatives = await images.derivatives_for_upload(supabase, file, stored)
+    return await services.create_product_image(product_id=product_id, image_url=stored.url, derivatives=derivatives, supabase=supabase)
 
 @admin_router.delete("/products/images/{image_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Admin - Products"])
-def delete_product_image(image_id: int, supabase: Client = Depends(get_supabase_client)):
-    success = services.delete_product_image(image_id=image_id, supabase=supabase)
-    if not success:
+async def delete_product_image(image_id: int, background_tasks: BackgroundTasks, supabase: SupabaseClient = Depends(get_supabase)):
+    image = await services.delete_product_image(image_id=image_id, supabase=supabase)
+    if image is None:
         raise HTTPException(status_code=404, detail="Image not found")
+    background_tasks.add_task(uploads.remove_image_objects, supabase, image)
     return None
 
 @admin_router.post("/products/images/{image_id}/set-primary", response_model=schemas.ProductImage, tags=["Admin - Products"])
-def set_primary_image(image_id: int, supabase: Client = Depends(get_supabase_client)):
-    image = services.set_primary_image(image_id=image_id, supabase=supabase)
+async def set_primary_image(image_id: int, supabase: SupabaseClient = Depends(get_supabase)):
+    image = await services.set_primary_image(image_id=image_id, supabase=supabase)
     if image is None:
         raise HTTPException(status_code=404, detail="Image not found")
     return image
 
 
 @admin_router.post("/products/{product_id}/variants", response_model=schemas.ProductVariant, tags=["Admin - Products"])
-def create_variant(product_id: int, variant: schemas.ProductVariantCreate, supabase: Client = Depends(get_supabase_client)):
-    return services.create_product_variant(product_id=product_id, variant=variant, supabase=supabase)
+async def create_variant(product_id: int, variant: schemas.ProductVariantCreate, supabase: SupabaseClient = Depends(get_supabase)):
+    return await services.create_product_variant(product_id=product_id, variant=variant, supabase=supabase)
 
 @admin_router.patch("/products/variants/{variant_id}", response_model=schemas.ProductVariant, tags=["Admin - Products"])
-def update_variant(variant_id: int, variant: schemas.ProductVariantUpdate, supabase: Client = Depends(get_supabase_client)):
-    db_variant = services.update_product_variant(variant_id=variant_id, variant=variant, supabase=supabase)
+async def update_variant(variant_id: int, variant: schemas.ProductVariantUpdate, supabase: SupabaseClient = Depends(get_supabase)):
+    db_variant = await services.update_product_variant(variant_id=variant_id, variant=variant, supabase=supabase)
     if db_variant is None:
         raise HTTPException(status_code=404, detail="Variant not found")
     return db_variant
 
 @admin_router.delete("/products/variants/{variant_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Admin - Products"])
-def delete_variant(variant_id: int, supabase: Client = Depends(get_supabase_client)):
-    success = services.delete_product_variant(variant_id=variant_id, supabase=supabase)
+async def delete_variant(variant_id: int, supabase: SupabaseClient = Depends(get_supabase)):
+    success = await services.delete_product_variant(variant_id=variant_id, supabase=supabase)
     if not success:
         raise HTTPException(status_code=404, detail="Variant not found")
     return None
 
-@admin_router.post("/products/variants/{variant_id}/image", response_model=schemas.ProductVariant, tags=["Admin - Products"])
-def upload_variant_image(variant_id: int, file: UploadFile = File(...), supabase: Client = Depends(get_supabase_client)):
-    file_path = f"variants/{variant_id}/{uuid.uuid4()}{file.filename}"
-    try:
-        file_content = file.file.read()
-        supabase.storage.from_("products").upload(file_path, file_content)
-        image_url = supabase.storage.from_("products").get_public_url(file_path)
-        return services.update_product_variant_image(variant_id=variant_id, image_url=image_url, supabase=supabase)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@upload_router.post("/products/variants/{variant_id}/image", response_model=schemas.ProductVariant, tags=["Admin - Products"])
+async def upload_variant_image(variant_id: int, file: UploadFile = File(...), supabase: SupabaseClient = Depends(get_supabase)):
+    stored = await uploads.store_image(supabase, file, prefix=f"variants/{variant_id}")
+    image_derivatives = await images.derivatives_for_upload(supabase, file, stored)
+    return await services.update_product_variant_image(variant_id=variant_id, image_url=stored.url, image_derivatives=image_derivatives, supabase=supabase)
 
 @admin_router.delete("/categories/{category_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Admin - Categories"])
-def delete_category(category_id: int, supabase: Client = Depends(get_supabase_client)):
-    success = services.delete_category(category_id=category_id, supabase=supabase)
+async def delete_category(category_id: int, supabase: SupabaseClient = Depends(get_supabase)):
+    success = await services.delete_category(category_id=category_id, supabase=supabase)
     if not success:
         raise HTTPException(status_code=404, detail="Category not found")
     return None
+
+@admin_router.post("/products/bulk", response_model=List[schemas.Product], tags=["Admin - Bulk"])
+async def bulk_create_products(products: List[schemas.ProductCreate], supabase: SupabaseClient = Depends(get_supabase)):
+    return await services.bulk_write("products", [product.model_dump() for product in products], supabase=supabase)
+
+@admin_router.put("/products/bulk", response_model=List[schemas.Product], tags=["Admin - Bulk"])
+async def bulk_upsert_products(products: List[schemas.ProductUpsert], supabase: SupabaseClient = Depends(get_supabase)):
+    return await services.bulk_write("products", [product.model_dump() for product in products], upsert=True, supabase=supabase)
+
+@admin_router.post("/products/bulk-delete", response_model=schemas.BulkDeleteResult, tags=["Admin - Bulk"])
+async def bulk_delete_products(request: schemas.BulkDeleteRequest, supabase: SupabaseClient = Depends(get_supabase)):
+    deleted = await services.bulk_delete("products", request.ids, supabase=supabase)
+    return {"deleted": len(deleted)}
+
+@admin_router.post("/products/variants/bulk", response_model=List[schemas.ProductVariant], tags=["Admin - Bulk"])
+async def bulk_create_variants(variants: List[schemas.ProductVariantBulkCreate], supabase: SupabaseClient = Depends(get_supabase)):
+    return await services.bulk_write("product_variants", [variant.model_dump() for variant in variants], supabase=supabase)
+
+@admin_router.put("/products/variants/bulk", response_model=List[schemas.ProductVariant], tags=["Admin - Bulk"])
+async def bulk_upsert_variants(variants: List[schemas.ProductVariantUpsert], supabase: SupabaseClient = Depends(get_supabase)):
+    return await services.bulk_write("product_variants", [variant.model_dump() for variant in variants], upsert=True, supabase=supabase)
+
+@admin_router.post("/products/variants/bulk-delete", response_model=schemas.BulkDeleteResult, tags=["Admin - Bulk"])
+async def bulk_delete_variants(request: schemas.BulkDeleteRequest, supabase: SupabaseClient = Depends(get_supabase)):
+    deleted = await services.bulk_delete("product_variants", request.ids, supabase=supabase)
+    return {"deleted": len(deleted)}
+
+@admin_router.post("/categories/bulk", response_model=List[schemas.Category], tags=["Admin - Bulk"])
+async def bulk_create_categories(categories: List[schemas.CategoryCreate], supabase: SupabaseClient = Depends(get_supabase)):
+    return await services.bulk_write("categories", [category.model_dump() for category in categories], supabase=supabase)
+
+@admin_router.put("/categories/bulk", response_model=List[schemas.Category], tags=["Admin - Bulk"])
+async def bulk_upsert_categories(categories: List[schemas.CategoryUpsert], supabase: SupabaseClient = Depends(get_supabase)):
+    return await services.bulk_write("categories", [category.model_dump() for category in categories], upsert=True, supabase=supabase)
+
+@admin_router.post("/categories/bulk-delete", response_model=schemas.BulkDeleteResult, tags=["Admin - Bulk"])
+async def bulk_delete_categories(request: schemas.BulkDeleteRequest, supabase: SupabaseClient = Depends(get_supabase)):
+    deleted = await services.bulk_delete("categories", request.ids, supabase=supabase)
+    return {"deleted": len(deleted)}
+
+@admin_router.post("/import/{entity}", response_model=schemas.ImportReport, tags=["Admin - Bulk"])
+async def import_catalog(
+    entity: catalog_import.ImportEntity,
+    file: UploadFile = File(...),
+    format: Optional[catalog_import.ImportFormat] = Query(None, description="Detected from the file name when omitted"),
+    mode: Literal["insert", "upsert"] = "insert",
+    chunk_size: int = Query(settings.BULK_CHUNK_SIZE, ge=1, le=5000),
+    supabase: SupabaseClient = Depends(get_supabase),
+):
+    return await catalog_import.import_catalog(
+        file=file,
+        entity=entity,
+        fmt=format,
+        chunk_size=chunk_size,
+        upsert=mode == "upsert",
+        supabase=supabase,
+    )
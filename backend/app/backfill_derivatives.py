@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+
+import structlog
+
+from . import images, uploads
+from .logging_config import setup_logging
+from .metrics import observe_upstream
+from .resilience import storage_breaker
+from .supabase_client import execute, run_client_call, init_async_supabase_client, close_async_supabase_client
+
+logger = structlog.get_logger(__name__)
+
+TARGETS = {
+    "product_images": ("image_url", "derivatives"),
+    "product_variants": ("image_url", "image_derivatives"),
+}
+
+
+async def download(supabase, path: str) -> bytes:
+    with observe_upstream("storage", uploads.PRODUCTS_BUCKET, "download"):
+        return await run_client_call(supabase.storage.from_(uploads.PRODUCTS_BUCKET).download, path)
+
+
+async def _process_row(supabase, table: str, row: dict, semaphore: asyncio.Semaphore) -> bool:
+    url_column, derivatives_column = TARGETS[table]
+    path = uploads.object_path_from_url(row[url_column])
+    async with semaphore:
+        try:
+            data = await storage_breaker.call(lambda: download(supabase, path))
+            derivatives = await images.build_derivatives(supabase, data, path)
+            await execute(supabase.table(table).update({derivatives_column: derivatives}).eq("id", row["id"]))
+        except Exception as exc:
+            logger.warning("derivative_backfill_failed", table=table, id=row["id"], path=path, error=str(exc))
+            return False
+    return True
+
+
+async def backfill_table(supabase, table: str, batch_size: int, concurrency: int) -> tuple[int, int]:
+    url_column, derivatives_column = TARGETS[table]
+    semaphore = asyncio.Semaphore(concurrency)
+    last_id = 0
+    processed = failed = 0
+    while True:
+        response = await execute(
+            supabase.table(table)
+            .select(f"id, {url_column}, {derivatives_column}")
+            .gt("id", last_id)
+            .order("id")
+            .limit(batch_size)
+        )
+        if not response.data:
+            break
+        last_id = response.data[-1]["id"]
+        pending = [row for row in response.data if row[url_column] and not row[derivatives_column]]
+        results = await asyncio.gather(*(_process_row(supabase, table, row, semaphore) for row in pending))
+        processed += results.count(True)
+        failed += results.count(False)
+        logger.info("derivative_backfill_batch", table=table, last_id=last_id, processed=processed, failed=failed)
+    return processed, failed
+
+
+async def backfill(batch_size: int, concurrency: int, tables: list[str]) -> None:
+    supabase = await init_async_supabase_client()
+    images.start_image_pool()
+    try:
+        for table in tables:
+            processed, failed = await backfill_table(supabase, table, batch_size, concurrency)
+            logger.info("derivative_backfill_done", table=table, processed=processed, failed=failed)
+    finally:
+        images.shutdown_image_pool()
+        await close_async_supabase_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate missing image derivatives for stored images.")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--table", choices=sorted(TARGETS), action="append", dest="tables")
+    args = parser.parse_args()
+
+    setup_logging()
+    asyncio.run(backfill(args.batch_size, args.concurrency, args.tables or list(TARGETS)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+
+import structlog
+
+from .config import settings
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fresh_until: float
+    stale_until: float
+
+
+class TTLCache:
+    def __init__(self, max_entries: int, ttl: float, stale_ttl: float, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.enabled = enabled
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._generation = 0
+        self._refreshing: dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _store(self, key: Hashable, value: Any, generation: int) -> None:
+        if generation != self._generation:
+            return
+        now = time.monotonic()
+        self._entries[key] = CacheEntry(value, now + self.ttl, now + self.ttl + self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> None:
+        generation = self._generation
+        try:
+            self._store(key, await loader(), generation)
+        except Exception as exc:
+            logger.warning("cache_refresh_failed", key=str(key), error=str(exc))
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await loader()
+
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if now < entry.fresh_until:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.value
+            if now < entry.stale_until:
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, loader))
+                return entry.value
+            del self._entries[key]
+
+        self.misses += 1
+        generation = self._generation
+        value = await loader()
+        self._store(key, value, generation)
+        return value
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry.fresh_until:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry.value
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        if self.enabled:
+            self._store(key, value, self._generation if generation is None else generation)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        self._generation += 1
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        self._generation += 1
+        for key in [key for key, entry in self._entries.items() if predicate(key, entry.value)]:
+            del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class CatalogVersion:
+    def __init__(self):
+        self.value = 0
+
+    def bump(self) -> None:
+        self.value += 1
+
+
+catalog_cache = TTLCache(
+    max_entries=settings.CATALOG_CACHE_MAX_ENTRIES,
+    ttl=settings.CATALOG_CACHE_TTL_SECONDS,
+    stale_ttl=settings.CATALOG_CACHE_STALE_SECONDS,
+    enabled=settings.CATALOG_CACHE_ENABLED,
+)
+
+search_cache = TTLCache(
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    ttl=settings.CATALOG_CACHE_TTL_SECONDS,
+    stale_ttl=settings.CATALOG_CACHE_STALE_SECONDS,
+    enabled=settings.CATALOG_CACHE_ENABLED,
+)
+
+response_cache = TTLCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.CATALOG_CACHE_TTL_SECONDS,
+    stale_ttl=0,
+    enabled=settings.CATALOG_CACHE_ENABLED,
+)
+
+stale_response_cache = TTLCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.CATALOG_STALE_IF_ERROR_SECONDS,
+    stale_ttl=0,
+    enabled=settings.CATALOG_CACHE_ENABLED,
+)
+
+catalog_version = CatalogVersion()
+
+
+def bump_catalog_version() -> None:
+    catalog_version.bump()
+    response_cache.clear()
@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+from typing import Iterator, Literal
+
+import structlog
+from fastapi import UploadFile
+from postgrest.exceptions import APIError
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import iterate_in_threadpool
+
+from . import schemas, services
+from .config import settings
+from .resilience import is_upstream_failure
+from .supabase_client import SupabaseClient
+
+logger = structlog.get_logger(__name__)
+
+ImportEntity = Literal["products", "variants", "categories"]
+ImportFormat = Literal["csv", "jsonl"]
+
+IMPORT_TARGETS: dict[str, tuple[str, type[BaseModel]]] = {
+    "products": ("products", schemas.ProductImportRow),
+    "variants": ("product_variants", schemas.ProductVariantImportRow),
+    "categories": ("categories", schemas.CategoryImportRow),
+}
+
+
+def detect_format(file: UploadFile) -> ImportFormat:
+    name = (file.filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson")) or file.content_type in ("application/x-ndjson", "application/jsonl"):
+        return "jsonl"
+    return "csv"
+
+
+def iter_records(binary_file, fmt: ImportFormat) -> Iterator[tuple[int, dict | str]]:
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            for row, record in enumerate(csv.DictReader(text), start=1):
+                yield row, {key: value if value != "" else None for key, value in record.items() if key is not None}
+        else:
+            row = 0
+            for line in text:
+                if not line.strip():
+                    continue
+                row += 1
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    yield row, f"Invalid JSON: {exc}"
+                    continue
+                yield row, record if isinstance(record, dict) else "Expected a JSON object"
+    finally:
+        text.detach()
+
+
+def _validation_messages(exc: ValidationError) -> list[str]:
+    return [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()]
+
+
+def iter_chunks(
+    binary_file, fmt: ImportFormat, row_model: type[BaseModel], chunk_size: int, upsert: bool
+) -> Iterator[tuple[list[tuple[int, dict]], list[schemas.ImportRowError]]]:
+    rows: list[tuple[int, dict]] = []
+    errors: list[schemas.ImportRowError] = []
+    for row, record in iter_records(binary_file, fmt):
+        if isinstance(record, str):
+            errors.append(schemas.ImportRowError(row=row, errors=[record]))
+        else:
+            try:
+                parsed = row_model.model_validate(record)
+            except ValidationError as exc:
+                errors.append(schemas.ImportRowError(row=row, errors=_validation_messages(exc)))
+            else:
+                if upsert and parsed.id is None:
+                    errors.append(schemas.ImportRowError(row=row, errors=["id: required for upsert"]))
+                else:
+                    rows.append((row, parsed.model_dump() if upsert else parsed.model_dump(exclude={"id"})))
+        if len(rows) + len(errors) >= chunk_size:
+            yield rows, errors
+            rows, errors = [], []
+    if rows or errors:
+        yield rows, errors
+
+
+def _record_errors(report: schemas.ImportReport, errors: list[schemas.ImportRowError]) -> None:
+    report.processed += len(errors)
+    report.failed += len(errors)
+    room = settings.IMPORT_MAX_REPORTED_ERRORS - len(report.errors)
+    if len(errors) > room:
+        report.errors_truncated = True
+    report.errors.extend(errors[:max(room, 0)])
+
+
+def _record_success(report: schemas.ImportReport, count: int) -> None:
+    report.processed += count
+    report.succeeded += count
+
+
+# Only rejected rows fall back to row-by-row writes; an upstream failure propagates so the import stops.
+async def _write_rows(
+    report: schemas.ImportReport, table: str, rows: list[tuple[int, dict]], chunk_size: int, upsert: bool, supabase: SupabaseClient
+) -> None:
+    try:
+        await services.bulk_write(table, [record for _, record in rows], upsert=upsert, chunk_size=chunk_size, supabase=supabase)
+    except APIError as exc:
+        if is_upstream_failure(exc):
+            raise
+    else:
+        _record_success(report, len(rows))
+        return
+    for row, record in rows:
+        try:
+            await services.bulk_write(table, [record], upsert=upsert, supabase=supabase)
+            _record_success(report, 1)
+        except APIError as exc:
+            if is_upstream_failure(exc):
+                raise
+            _record_errors(report, [schemas.ImportRowError(row=row, errors=[exc.message or str(exc)])])
+
+
+async def import_catalog(
+    file: UploadFile,
+    entity: ImportEntity,
+    fmt: ImportFormat | None,
+    chunk_size: int,
+    upsert: bool,
+    supabase: SupabaseClient,
+) -> schemas.ImportReport:
+    table, row_model = IMPORT_TARGETS[entity]
+    report = schemas.ImportReport()
+    chunks = iter_chunks(file.file, fmt or detect_format(file), row_model, chunk_size, upsert)
+
+    async for rows, errors in iterate_in_threadpool(chunks):
+        report.chunks += 1
+        _record_errors(report, errors)
+        if not rows:
+            continue
+        try:
+            await _write_rows(report, table, rows, chunk_size, upsert, supabase)
+        except Exception as exc:
+            if not is_upstream_failure(exc):
+                raise
+            report.aborted = True
+            report.abort_reason = getattr(exc, "message", None) or str(exc) or type(exc).__name__
+            logger.warning("catalog_import_aborted", table=table, processed=report.processed, succeeded=report.succeeded, error=report.abort_reason)
+            break
+    return report
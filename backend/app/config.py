@@ -1,3 +1,4 @@
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -10,5 +11,87 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 1024
+    AUTH_GENERATION_REFRESH_SECONDS: float = 5.0
+    METRICS_TOKEN: Optional[str] = None
+
+    SUPABASE_POOL_MAX_CONNECTIONS: int = 20
+    SUPABASE_POOL_MAX_KEEPALIVE: int = 10
+    SUPABASE_POOL_KEEPALIVE_EXPIRY: float = 30.0
+    SUPABASE_POOL_TIMEOUT: float = 5.0
+    SUPABASE_CONNECT_TIMEOUT: float = 5.0
+    SUPABASE_READ_TIMEOUT: float = 30.0
+    SUPABASE_HTTP2: bool = True
+
+    UPSTREAM_DEADLINE_SECONDS: float = 10.0
+    UPSTREAM_MAX_RETRIES: int = 2
+    UPSTREAM_RETRY_BASE_DELAY: float = 0.05
+    UPSTREAM_RETRY_MAX_DELAY: float = 1.0
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_SECONDS: float = 30.0
+    BREAKER_HALF_OPEN_MAX_CALLS: int = 1
+    CATALOG_STALE_IF_ERROR_SECONDS: float = 3600.0
+    SUPABASE_CLIENT_MODE: Literal["sync", "async"] = "async"
+
+    CATALOG_CACHE_ENABLED: bool = True
+    CATALOG_CACHE_MAX_ENTRIES: int = 1024
+    CATALOG_CACHE_TTL_SECONDS: float = 60.0
+    CATALOG_CACHE_STALE_SECONDS: float = 300.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 256
+    CATALOG_HTTP_MAX_AGE: int = 0
+    CATALOG_HTTP_S_MAXAGE: int = 60
+    JSON_RESPONSE_MODE: Literal["standard", "fast", "trusted"] = "standard"
+    JSON_SERIALIZE_CHUNK_SIZE: int = 200
+
+    LOG_MODE: Literal["sync", "queue"] = "sync"
+    LOG_RENDERER: Literal["json", "orjson"] = "json"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_QUEUE_RESERVED_SLOTS: int = 500
+    LOG_OVERFLOW_POLICY: Literal["drop_new", "drop_oldest"] = "drop_new"
+    LOG_INFO_SAMPLE_RATE: float = 1.0
+    LOG_FLUSH_TIMEOUT_SECONDS: float = 2.0
+
+    PRODUCTS_PAGE_MAX_LIMIT: int = 100
+
+    BULK_CHUNK_SIZE: int = 500
+    IMPORT_MAX_REPORTED_ERRORS: int = 1000
+
+    SEARCH_ENABLED: bool = True
+    SEARCH_INDEX_BATCH_SIZE: int = 1000
+    SEARCH_PAGE_MAX_LIMIT: int = 50
+    SEARCH_MAX_PREFIX_TERMS: int = 64
+    SEARCH_MIN_PREFIX_LENGTH: int = 2
+    SEARCH_RESYNC_SECONDS: float = 300.0
+    SEARCH_CACHE_MAX_ENTRIES: int = 128
+
+    CATALOG_EVENTS_BUFFER_SIZE: int = 1024
+    CATALOG_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    CATALOG_STREAM_RETRY_MS: int = 3000
+    CATALOG_REALTIME_ENABLED: bool = False
+
+    STOCK_RESERVATION_TTL_SECONDS: int = 300
+    STOCK_RESERVATION_MAX_LINES: int = 100
+    STOCK_RESERVATION_MAX_LINE_QUANTITY: int = 20
+    STOCK_RESERVATION_MAX_ACTIVE_PER_CLIENT: int = 5
+    STOCK_RESERVATION_RATE_LIMIT: int = 30
+    STOCK_RESERVATION_RATE_WINDOW_SECONDS: float = 60.0
+    CART_TOKEN_EXPIRE_MINUTES: int = 24 * 60
+    CART_TOKEN_RATE_LIMIT: int = 60
+    CLIENT_ADDRESS_HEADER: Optional[str] = None
+    STOCK_RESERVATION_BATCH_MAX: int = 64
+    STOCK_RESERVATION_SWEEP_SECONDS: float = 30.0
+
+    MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 256 * 1024
+    UPLOAD_MIN_BYTES_PER_SECOND: int = 256 * 1024
+    MAX_CONCURRENT_UPLOADS: int = 4
+
+    IMAGE_DERIVATIVES_ENABLED: bool = True
+    IMAGE_DERIVATIVE_WIDTHS: list[int] = [200, 600, 1200]
+    IMAGE_DERIVATIVE_FORMATS: list[Literal["webp", "jpeg"]] = ["webp", "jpeg"]
+    IMAGE_DERIVATIVE_QUALITY: int = 80
+    IMAGE_MAX_PIXELS: int = 40_000_000
+    IMAGE_PROCESS_WORKERS: int = 2
+    IMAGE_DERIVATIVE_UPLOAD_CONCURRENCY: int = 2
 
 settings = Settings()
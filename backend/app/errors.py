@@ -3,11 +3,16 @@ from fastapi.responses import JSONResponse
 import structlog
 import traceback
 import sys
+import math
+
+from .resilience import UpstreamError, is_upstream_failure
 
 logger = structlog.get_logger(__name__)
 
 
 async def global_exception_handler(request: Request, exc: Exception):
+    if is_upstream_failure(exc):
+        return await upstream_exception_handler(request, exc)
     try:
         logger.error(
             "unhandled_exception",
@@ -28,3 +33,17 @@ async def global_exception_handler(request: Request, exc: Exception):
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "An unexpected internal server error occurred."},
     )
+
+
+async def upstream_exception_handler(request: Request, exc: Exception):
+    logger.warning(
+        "upstream_unavailable",
+        error=str(exc) or type(exc).__name__,
+        request_method=request.method,
+        request_url=str(request.url),
+    )
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Upstream service is temporarily unavailable."},
+        headers={"Retry-After": str(max(1, math.ceil(getattr(exc, "retry_after", UpstreamError.retry_after))))},
+    )
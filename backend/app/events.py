@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable
+
+import orjson
+
+from .config import settings
+
+DELTA_FIELDS = {
+    "product": ("id", "name", "price", "stock_quantity", "category_id"),
+    "variant": ("id", "product_id", "name", "stock_quantity"),
+    "image": ("id", "product_id", "is_primary"),
+    "category": ("id", "name"),
+}
+DELETE_FIELDS = ("id", "product_id")
+
+TABLE_ENTITIES = {
+    "products": "product",
+    "product_variants": "variant",
+    "product_images": "image",
+    "categories": "category",
+}
+
+
+@dataclass(frozen=True)
+class CatalogEvent:
+    seq: int
+    event_id: str
+    data: bytes
+
+    @property
+    def sse(self) -> bytes:
+        return b"id: " + self.event_id.encode() + b"\ndata: " + self.data + b"\n\n"
+
+
+def compact(entity: str, op: str, row: dict) -> dict:
+    fields = DELETE_FIELDS if op == "delete" else DELTA_FIELDS[entity]
+    return {field: row[field] for field in fields if field in row}
+
+
+class CatalogEventHub:
+    def __init__(self, buffer_size: int):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.realtime_active = False
+        self.subscribers = 0
+        self.published = 0
+        self._buffer: deque[CatalogEvent] = deque(maxlen=buffer_size)
+        self._changed = asyncio.Event()
+
+    def _event(self, seq: int, payload: dict) -> CatalogEvent:
+        event_id = f"{self.epoch}:{seq}"
+        return CatalogEvent(seq, event_id, orjson.dumps({"id": event_id, **payload}))
+
+    def _append(self, payload: dict) -> None:
+        self.seq += 1
+        self.published += 1
+        self._buffer.append(self._event(self.seq, payload))
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, table: str, op: str, rows: Iterable[dict], source: str = "local") -> None:
+        if source == "local" and self.realtime_active:
+            return
+        entity = TABLE_ENTITIES[table]
+        rows = [compact(entity, op, row) for row in rows]
+        if rows:
+            self._append({"type": "change", "entity": entity, "op": op, "rows": rows})
+
+    def reset(self) -> None:
+        self._append({"type": "reset"})
+
+    def reset_event(self) -> CatalogEvent:
+        return self._event(self.seq, {"type": "reset"})
+
+    def resume_point(self, last_event_id: str | None) -> tuple[int, bool]:
+        if not last_event_id:
+            return self.seq, False
+        epoch, _, seq = last_event_id.partition(":")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return self.seq, True
+        return int(seq), False
+
+    def since(self, seq: int) -> list[CatalogEvent] | None:
+        if seq >= self.seq:
+            return []
+        if not self._buffer or seq < self._buffer[0].seq - 1:
+            return None
+        return list(itertools.islice(self._buffer, seq - self._buffer[0].seq + 1, None))
+
+    async def follow(self, last_event_id: str | None) -> AsyncIterator[CatalogEvent | None]:
+        seq, reset = self.resume_point(last_event_id)
+        self.subscribers += 1
+        try:
+            if reset:
+                yield self.reset_event()
+            while True:
+                changed = self._changed
+                events = self.since(seq)
+                if events is None:
+                    seq = self.seq
+                    yield self.reset_event()
+                    continue
+                for event in events:
+                    yield event
+                if events:
+                    seq = events[-1].seq
+                    continue
+                try:
+                    async with asyncio.timeout(settings.CATALOG_STREAM_HEARTBEAT_SECONDS):
+                        await changed.wait()
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.subscribers -= 1
+
+    def stats(self) -> dict:
+        return {
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "buffered": len(self._buffer),
+            "subscribers": self.subscribers,
+            "published": self.published,
+            "realtime_active": self.realtime_active,
+        }
+
+
+async def sse_stream(last_event_id: str | None) -> AsyncIterator[bytes]:
+    yield f"retry: {settings.CATALOG_STREAM_RETRY_MS}\n\n".encode()
+    async for event in catalog_events.follow(last_event_id):
+        yield b": keep-alive\n\n" if event is None else event.sse
+
+
+catalog_events = CatalogEventHub(settings.CATALOG_EVENTS_BUFFER_SIZE)
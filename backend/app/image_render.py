@@ -0,0 +1,59 @@
+# Runs inside the spawned image pool; import nothing from app here so workers never load metrics or clients.
+from io import BytesIO
+
+from PIL import Image
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+
+ORIENTATION_TAG = 0x0112
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def render_derivatives(data: bytes, widths: list[int], formats: list[str], quality: int, max_pixels: int) -> list[tuple[int, str, bytes]]:
+    rendered = []
+    with Image.open(BytesIO(data)) as source:
+        # Image.open only parses the header, so this rejects decompression bombs before any pixels are decoded.
+        if source.width * source.height > max_pixels:
+            raise ImageTooLarge(f"Image has {source.width * source.height} pixels, more than the {max_pixels} allowed")
+        source.seek(0)
+        orientation = source.getexif().get(ORIENTATION_TAG, 1)
+        display_width = source.height if orientation in (5, 6, 7, 8) else source.width
+        scale = min(1.0, max(widths) / display_width)
+        target = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+        # JPEG decodes straight at 1/2, 1/4 or 1/8 scale; the rest is reduced by an integer factor before resampling.
+        source.draft(source.mode, target)
+        image = source if source.size == target else source.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if orientation in ORIENTATION_TRANSPOSE:
+            image = image.transpose(ORIENTATION_TRANSPOSE[orientation])
+        # Largest width first, each step resized from the previous one instead of the full-resolution original.
+        for width in sorted(set(widths), reverse=True):
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                pil_format = FORMATS[fmt][0]
+                frame = image
+                if pil_format == "JPEG" and frame.mode != "RGB":
+                    frame = frame.convert("RGB")
+                elif frame.mode not in ("RGB", "RGBA"):
+                    frame = frame.convert("RGBA")
+                buffer = BytesIO()
+                frame.save(buffer, format=pil_format, quality=quality, optimize=True)
+                rendered.append((width, fmt, buffer.getvalue()))
+    rendered.sort(key=lambda item: (widths.index(item[0]), formats.index(item[1])))
+    return rendered
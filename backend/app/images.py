@@ -0,0 +1,90 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import structlog
+from fastapi import UploadFile
+
+from . import uploads
+from .config import settings
+from .image_render import FORMATS, render_derivatives
+from .supabase_client import SupabaseClient
+
+logger = structlog.get_logger(__name__)
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def start_image_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_image_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def derivative_path(original_path: str, width: int, fmt: str) -> str:
+    stem = os.path.splitext(original_path)[0]
+    return f"{stem}_{width}w.{FORMATS[fmt][2]}"
+
+
+async def build_derivatives(supabase: SupabaseClient, data: bytes, original_path: str) -> list[dict]:
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(
+        start_image_pool(),
+        partial(
+            render_derivatives,
+            data,
+            settings.IMAGE_DERIVATIVE_WIDTHS,
+            settings.IMAGE_DERIVATIVE_FORMATS,
+            settings.IMAGE_DERIVATIVE_QUALITY,
+            settings.IMAGE_MAX_PIXELS,
+        ),
+    )
+
+    slots = asyncio.Semaphore(settings.IMAGE_DERIVATIVE_UPLOAD_CONCURRENCY)
+    stored: list[str] = []
+
+    async def store(width: int, fmt: str, body: bytes) -> dict:
+        path = derivative_path(original_path, width, fmt)
+        async with slots:
+            stored.append(path)
+            await uploads.upload_object(supabase, path, body, FORMATS[fmt][1])
+        return {"width": width, "format": fmt, "url": await uploads.public_url(supabase, path)}
+
+    # A failed upload cancels the rest; every path already started is removed rather than orphaned.
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(store(width, fmt, body)) for width, fmt, body in rendered]
+    except BaseException as exc:
+        if stored:
+            await uploads.discard_objects(supabase, stored)
+        if isinstance(exc, BaseExceptionGroup):
+            raise exc.exceptions[0]
+        raise
+    return [task.result() for task in tasks]
+
+
+async def derivatives_for_upload(supabase: SupabaseClient, file: UploadFile, stored: uploads.StoredImage) -> list[dict]:
+    if not settings.IMAGE_DERIVATIVES_ENABLED:
+        return []
+    # Shares upload_slots with store_image so concurrent uploads hold at most MAX_CONCURRENT_UPLOADS bodies in memory.
+    async with uploads.upload_slots:
+        await file.seek(0)
+        data = await file.read()
+        try:
+            return await build_derivatives(supabase, data, stored.path)
+        except Exception as exc:
+            logger.warning("image_derivatives_failed", path=stored.path, error=str(exc))
+            return []
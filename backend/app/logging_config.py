@@ -1,11 +1,104 @@
+import atexit
 import logging
 import logging.config
+import logging.handlers
+import queue
+import random
 import sys
+import orjson
 import structlog
 import os
 
+from .config import settings
+from .metrics import LOG_RECORDS_DROPPED
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def _orjson_dumps(obj, default=None) -> str:
+    return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.INFO or self.rate >= 1.0 or random.random() < self.rate
+
+
+# Never blocks the caller: INFO and below overflow at soft_limit per policy, while WARNING and above
+# may also use the reserved slots above it; anything that still does not fit is counted as dropped.
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue, policy: str, soft_limit: int):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.soft_limit = soft_limit
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def _drop(self, record: logging.LogRecord) -> None:
+        LOG_RECORDS_DROPPED.labels(record.levelname).inc()
+
+    # drop_oldest only ever evicts a queued INFO-or-below record, so a flood cannot push out queued errors.
+    def _evict_oldest_below_warning(self) -> bool:
+        log_queue = self.queue
+        with log_queue.mutex:
+            for index, queued in enumerate(log_queue.queue):
+                if queued is not None and queued.levelno < logging.WARNING:
+                    del log_queue.queue[index]
+                    log_queue.unfinished_tasks -= 1
+                    if not log_queue.unfinished_tasks:
+                        log_queue.all_tasks_done.notify_all()
+                    log_queue.not_full.notify()
+                    break
+            else:
+                return False
+        self._drop(queued)
+        return True
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.levelno < logging.WARNING and self.queue.qsize() >= self.soft_limit:
+            if self.policy == "drop_new" or not self._evict_oldest_below_warning():
+                self._drop(record)
+                return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._drop(record)
+
+
+# QueueListener.stop() enqueues its sentinel with put_nowait, which raises queue.Full on a full queue;
+# wait for room instead, and give up on the remaining backlog after LOG_FLUSH_TIMEOUT_SECONDS.
+class BoundedQueueListener(logging.handlers.QueueListener):
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=settings.LOG_FLUSH_TIMEOUT_SECONDS)
+        except queue.Full:
+            return
+        self._thread.join(settings.LOG_FLUSH_TIMEOUT_SECONDS)
+        self._thread = None
+
+
+def stop_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def setup_logging():
+    global _listener
     log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    renderer = (
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps)
+        if settings.LOG_RENDERER == "orjson"
+        else structlog.processors.JSONRenderer()
+    )
 
     config = {
         "version": 1,
@@ -13,7 +106,7 @@ def setup_logging():
         "formatters": {
             "json": {
                 "()": structlog.stdlib.ProcessorFormatter,
-                "processor": structlog.processors.JSONRenderer(),
+                "processor": renderer,
                 "foreign_pre_chain": [
                     structlog.stdlib.add_logger_name,
                     structlog.stdlib.add_log_level,
@@ -37,8 +130,26 @@ def setup_logging():
         },
     }
 
+    stop_logging()
     logging.config.dictConfig(config)
 
+    root = logging.getLogger()
+    if settings.LOG_MODE == "queue":
+        handlers = root.handlers[:]
+        for handler in handlers:
+            root.removeHandler(handler)
+        queue_handler = BoundedQueueHandler(
+            queue.Queue(maxsize=settings.LOG_QUEUE_SIZE + settings.LOG_QUEUE_RESERVED_SLOTS),
+            settings.LOG_OVERFLOW_POLICY,
+            settings.LOG_QUEUE_SIZE,
+        )
+        root.addHandler(queue_handler)
+        _listener = BoundedQueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    if settings.LOG_INFO_SAMPLE_RATE < 1.0:
+        for handler in root.handlers:
+            handler.addFilter(SamplingFilter(settings.LOG_INFO_SAMPLE_RATE))
+
     structlog.configure(
         processors=[
             structlog.stdlib.filter_by_level,
@@ -54,3 +165,6 @@ def setup_logging():
         cache_logger_on_first_use=True,
     )
     print("--- LOGGING HAS BEEN DEFINITIVELY CONFIGURED ---")
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import structlog
+import websockets
+
+from . import services
+from .cache import catalog_cache, search_cache, bump_catalog_version
+from .config import settings
+from .events import TABLE_ENTITIES, catalog_events
+from .singleflight import catalog_flights
+
+logger = structlog.get_logger(__name__)
+
+TOPIC = "realtime:catalog"
+HEARTBEAT_SECONDS = 25
+
+
+def realtime_url() -> str:
+    base = settings.SUPABASE_URL.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+    return f"{base}/realtime/v1/websocket?apikey={settings.SUPABASE_KEY}&vsn=1.0.0"
+
+
+def join_message() -> str:
+    changes = [{"event": "*", "schema": "public", "table": table} for table in TABLE_ENTITIES]
+    return json.dumps({
+        "topic": TOPIC,
+        "event": "phx_join",
+        "payload": {"config": {"postgres_changes": changes}, "access_token": settings.SUPABASE_KEY},
+        "ref": "join",
+    })
+
+
+# Tables use replica identity full, so an UPDATE carries the whole old row to compare against.
+def is_stock_only_update(data: dict) -> bool:
+    old, new = data.get("old_record") or {}, data.get("record") or {}
+    if data.get("type") != "UPDATE" or not old or old.keys() != new.keys():
+        return False
+    return all(old[key] == new[key] for key in new if key != "stock_quantity")
+
+
+def apply_change(data: dict) -> None:
+    table = data.get("table")
+    if table not in TABLE_ENTITIES:
+        return
+    op = "delete" if data.get("type") == "DELETE" else "upsert"
+    row = (data.get("old_record") if op == "delete" else data.get("record")) or {}
+    if table in ("products", "product_variants") and is_stock_only_update(data):
+        services.invalidate_product_stock([row["id"] if table == "products" else row["product_id"]])
+    elif table == "products" and "id" in row:
+        services.invalidate_product(row["id"])
+    elif table == "categories" and "id" in row:
+        services.invalidate_category(row["id"])
+    elif "product_id" in row:
+        services.invalidate_product(row["product_id"])
+    catalog_events.publish(table, op, [row], source="realtime")
+
+
+def resync() -> None:
+    bump_catalog_version()
+    catalog_cache.clear()
+    search_cache.clear()
+    catalog_flights.forget_all()
+    catalog_events.reset()
+
+
+class RealtimeListener:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.connects = 0
+
+    async def _heartbeat(self, ws) -> None:
+        ref = 0
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            ref += 1
+            await ws.send(json.dumps({"topic": "phoenix", "event": "heartbeat", "payload": {}, "ref": str(ref)}))
+
+    async def _listen(self) -> None:
+        async with websockets.connect(realtime_url()) as ws:
+            await ws.send(join_message())
+            heartbeat = asyncio.create_task(self._heartbeat(ws))
+            try:
+                async for raw in ws:
+                    message = json.loads(raw)
+                    if message.get("event") == "phx_reply" and message.get("ref") == "join":
+                        if message.get("payload", {}).get("status") != "ok":
+                            raise RuntimeError(f"Realtime join rejected: {message.get('payload')}")
+                        if self.connects:
+                            resync()
+                        self.connects += 1
+                        catalog_events.realtime_active = True
+                        logger.info("realtime_subscribed", topic=TOPIC)
+                    elif message.get("event") == "postgres_changes":
+                        apply_change(message.get("payload", {}).get("data", {}))
+            finally:
+                heartbeat.cancel()
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                await self._listen()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("realtime_disconnected", error=str(exc), retry_in=backoff)
+            finally:
+                catalog_events.realtime_active = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+realtime_listener = RealtimeListener()
@@ -0,0 +1,245 @@
+import asyncio
+import math
+import time
+import uuid
+from collections.abc import Hashable
+from datetime import datetime, timedelta, timezone
+
+import structlog
+from fastapi import Depends, Header, HTTPException, Request, status
+from jose import JWTError, jwt
+
+from . import schemas
+from .config import settings
+from .events import catalog_events
+from .services import invalidate_product_stock
+from .supabase_client import SupabaseClient, execute, get_supabase
+
+logger = structlog.get_logger(__name__)
+
+
+# Fixed-window request counter per key; one per worker, so the effective limit scales with workers.
+class RateLimiter:
+    def __init__(self, limit: int, window: float, max_keys: int = 10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._windows: dict[Hashable, tuple[float, int]] = {}
+        self.rejected = 0
+
+    def acquire(self, key: Hashable) -> float:
+        now = time.monotonic()
+        started, count = self._windows.get(key, (now, 0))
+        if now - started >= self.window:
+            started, count = now, 0
+        if count >= self.limit:
+            self.rejected += 1
+            return started + self.window - now
+        if key not in self._windows and len(self._windows) >= self.max_keys:
+            self._windows = {k: v for k, v in self._windows.items() if now - v[0] < self.window}
+        self._windows[key] = (started, count + 1)
+        return 0.0
+
+
+def enforce_rate_limit(limiter: RateLimiter, key: Hashable) -> None:
+    retry_after = limiter.acquire(key)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+# Behind a proxy every peer address is the proxy's; CLIENT_ADDRESS_HEADER names the header it sets with the shopper's address.
+async def client_address(request: Request) -> str | None:
+    if settings.CLIENT_ADDRESS_HEADER:
+        address = request.headers.get(settings.CLIENT_ADDRESS_HEADER)
+        if address:
+            return address.strip()
+    return request.client.host if request.client else None
+
+
+async def limit_cart_minting(address: str | None = Depends(client_address)) -> None:
+    enforce_rate_limit(cart_token_limiter, address)
+
+
+def create_cart_token() -> dict:
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.CART_TOKEN_EXPIRE_MINUTES)
+    token = jwt.encode({"cart": uuid.uuid4().hex, "exp": expires_at}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    return {"cart_token": token, "expires_at": expires_at}
+
+
+async def get_cart_id(x_cart_token: str | None = Header(None)) -> str:
+    try:
+        payload = jwt.decode(x_cart_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]) if x_cart_token else {}
+    except JWTError:
+        payload = {}
+    if not isinstance(payload.get("cart"), str):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid cart token")
+    return payload["cart"]
+
+
+def apply_stock_levels(stock: dict) -> None:
+    products, variants = stock["products"], stock["variants"]
+    catalog_events.publish("products", "upsert", products)
+    catalog_events.publish("product_variants", "upsert", variants)
+    product_ids = {row["id"] for row in products} | {row["product_id"] for row in variants}
+    if product_ids:
+        invalidate_product_stock(product_ids)
+
+
+# Concurrent reservations queue up while one reserve_stock_batch call is in flight and go out together.
+class ReservationBatcher:
+    def __init__(self):
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._task: asyncio.Task | None = None
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    async def reserve(self, request: dict, supabase: SupabaseClient) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((request, future))
+        self.requests += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain(supabase))
+        return await future
+
+    async def _drain(self, supabase: SupabaseClient) -> None:
+        batch = []
+        try:
+            while self._pending:
+                batch = self._pending[:settings.STOCK_RESERVATION_BATCH_MAX]
+                del self._pending[:len(batch)]
+                self.batches += 1
+                self.largest_batch = max(self.largest_batch, len(batch))
+                try:
+                    response = await execute(supabase.rpc("reserve_stock_batch", {"p_requests": [request for request, _ in batch]}))
+                    results = response.data["results"]
+                    if len(results) != len(batch):
+                        raise RuntimeError(f"reserve_stock_batch returned {len(results)} results for {len(batch)} requests")
+                except Exception as exc:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+                try:
+                    apply_stock_levels(response.data["stock"])
+                except Exception as exc:
+                    logger.warning("stock_levels_apply_failed", error=str(exc))
+        except asyncio.CancelledError:
+            for _, future in batch + self._pending:
+                future.cancel()
+            self._pending.clear()
+            raise
+        finally:
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "pending": len(self._pending),
+            "rate_limited": reservation_limiter.rejected + cart_token_limiter.rejected,
+        }
+
+
+async def reserve_stock(request: schemas.ReservationCreate, cart_id: str, client: str | None, supabase: SupabaseClient) -> dict:
+    if len(request.items) > settings.STOCK_RESERVATION_MAX_LINES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A reservation can hold at most {settings.STOCK_RESERVATION_MAX_LINES} lines",
+        )
+    quantities: dict[tuple, int] = {}
+    for item in request.items:
+        key = (item.product_id, item.variant_id)
+        quantities[key] = quantities.get(key, 0) + item.quantity
+    if max(quantities.values()) > settings.STOCK_RESERVATION_MAX_LINE_QUANTITY:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A reservation can hold at most {settings.STOCK_RESERVATION_MAX_LINE_QUANTITY} of each item",
+        )
+    enforce_rate_limit(reservation_limiter, cart_id)
+    result = await reservation_batcher.reserve(
+        {
+            "items": [item.model_dump() for item in request.items],
+            "ttl_seconds": settings.STOCK_RESERVATION_TTL_SECONDS,
+            "cart_id": cart_id,
+            "client_key": client or cart_id,
+            "max_active": settings.STOCK_RESERVATION_MAX_ACTIVE_PER_CLIENT,
+        },
+        supabase,
+    )
+    if "error" in result:
+        logger.warning("stock_reservation_rejected", error=result["error"])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid reservation request")
+    if result.get("limited"):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"A client can hold at most {settings.STOCK_RESERVATION_MAX_ACTIVE_PER_CLIENT} active reservations",
+        )
+    if not result["reserved"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Insufficient stock", "shortages": result["shortages"]},
+        )
+    return {"id": result["id"], "expires_at": result["expires_at"]}
+
+
+async def commit_reservation(reservation_id: uuid.UUID, cart_id: str, supabase: SupabaseClient) -> bool:
+    response = await execute(supabase.rpc("commit_stock_reservation", {"p_reservation_id": str(reservation_id), "p_cart_id": cart_id}))
+    return bool(response.data)
+
+
+async def release_reservation(reservation_id: uuid.UUID, cart_id: str, supabase: SupabaseClient) -> bool:
+    response = await execute(supabase.rpc("release_stock_reservation", {"p_reservation_id": str(reservation_id), "p_cart_id": cart_id}))
+    if not response.data:
+        return False
+    apply_stock_levels(response.data["stock"])
+    return True
+
+
+async def expire_reservations(supabase: SupabaseClient) -> int:
+    response = await execute(supabase.rpc("expire_stock_reservations", {}))
+    if response.data["expired"]:
+        apply_stock_levels(response.data["stock"])
+        logger.info("stock_reservations_expired", count=response.data["expired"])
+    return response.data["expired"]
+
+
+class ReservationSweeper:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        supabase = await get_supabase()
+        while True:
+            await asyncio.sleep(settings.STOCK_RESERVATION_SWEEP_SECONDS)
+            try:
+                await expire_reservations(supabase)
+            except Exception as exc:
+                logger.warning("stock_reservation_sweep_failed", error=str(exc))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+reservation_limiter = RateLimiter(settings.STOCK_RESERVATION_RATE_LIMIT, settings.STOCK_RESERVATION_RATE_WINDOW_SECONDS)
+cart_token_limiter = RateLimiter(settings.CART_TOKEN_RATE_LIMIT, settings.STOCK_RESERVATION_RATE_WINDOW_SECONDS)
+reservation_batcher = ReservationBatcher()
+reservation_sweeper = ReservationSweeper()
@@ -0,0 +1,136 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+from postgrest.exceptions import APIError
+
+from .config import settings
+from .metrics import BREAKER_STATE
+
+T = TypeVar("T")
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+# Postgres/PostgREST codes that signal an unhealthy database rather than a bad request
+RETRYABLE_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "57014", "57P01", "53300", "53400", "08000", "08003", "08006"}
+
+
+class UpstreamError(Exception):
+    retry_after: float = 1.0
+
+
+class UpstreamTimeout(UpstreamError):
+    pass
+
+
+class CircuitOpenError(UpstreamError):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open")
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    if isinstance(exc, (UpstreamError, httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    if isinstance(exc, APIError):
+        code = str(exc.code or "")
+        return code in RETRYABLE_CODES or (len(code) == 3 and code.isdigit() and int(code) >= 500)
+    return False
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self.retries = 0
+        self._half_open_calls = 0
+        BREAKER_STATE.labels(name).set(0)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        BREAKER_STATE.labels(self.name).set(BREAKER_STATES[state])
+
+    def retry_after(self) -> float:
+        return max(0.0, settings.BREAKER_RESET_SECONDS - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> None:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < settings.BREAKER_RESET_SECONDS:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.retry_after())
+            self._set_state("half_open")
+            self._half_open_calls = 0
+        if self.state == "half_open":
+            if self._half_open_calls >= settings.BREAKER_HALF_OPEN_MAX_CALLS:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, 1.0)
+            self._half_open_calls += 1
+
+    def _release_probe(self) -> None:
+        if self.state == "half_open":
+            self._half_open_calls = max(0, self._half_open_calls - 1)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state != "closed":
+            self._set_state("closed")
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= settings.BREAKER_FAILURE_THRESHOLD:
+            if self.state != "open":
+                self.opens += 1
+            self._set_state("open")
+            self.opened_at = time.monotonic()
+
+    async def call(self, func: Callable[[], Awaitable[T]], retry: bool = True, deadline: float | None = None) -> T:
+        expires = time.monotonic() + (settings.UPSTREAM_DEADLINE_SECONDS if deadline is None else deadline)
+        attempts = settings.UPSTREAM_MAX_RETRIES + 1 if retry else 1
+        for attempt in range(attempts):
+            self.allow()
+            try:
+                remaining = expires - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                async with asyncio.timeout(remaining):
+                    result = await func()
+            except asyncio.CancelledError:
+                self._release_probe()
+                raise
+            except Exception as exc:
+                if not is_upstream_failure(exc):
+                    self._release_probe()
+                    raise
+                self.record_failure()
+                delay = random.uniform(0, min(settings.UPSTREAM_RETRY_MAX_DELAY, settings.UPSTREAM_RETRY_BASE_DELAY * 2 ** attempt))
+                if attempt + 1 >= attempts or self.state == "open" or time.monotonic() + delay >= expires:
+                    if isinstance(exc, asyncio.TimeoutError):
+                        raise UpstreamTimeout(f"{self.name} call exceeded its deadline") from exc
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+            else:
+                self.record_success()
+                return result
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "retry_after": round(self.retry_after(), 1) if self.state == "open" else 0.0,
+        }
+
+
+postgrest_breaker = CircuitBreaker("postgrest")
+storage_breaker = CircuitBreaker("storage")
+upstream_breakers = {breaker.name: breaker for breaker in (postgrest_breaker, storage_breaker)}
@@ -0,0 +1,171 @@
+import hashlib
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Hashable, get_args, get_origin
+
+import orjson
+import structlog
+from fastapi import Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from .cache import response_cache, stale_response_cache, catalog_version
+from .config import settings
+from .resilience import is_upstream_failure
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: datetime
+    headers: dict[str, str] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+
+
+_adapters: dict[Any, TypeAdapter] = {}
+
+
+def get_adapter(model: Any) -> TypeAdapter:
+    adapter = _adapters.get(model)
+    if adapter is None:
+        adapter = _adapters[model] = TypeAdapter(model)
+    return adapter
+
+
+# Rows that passed validation against `model` when they were loaded into the catalog cache.
+class Validated(dict):
+    __slots__ = ("model",)
+
+    def __init__(self, model: Any, row: dict):
+        super().__init__(row)
+        self.model = model
+
+
+def mark_validated(data: Any, model: Any) -> Any:
+    if settings.JSON_RESPONSE_MODE != "trusted" or data is None:
+        return data
+    if isinstance(data, list):
+        get_adapter(list[model]).validate_python(data)
+        return [Validated(model, row) for row in data]
+    get_adapter(model).validate_python(data)
+    return Validated(model, data)
+
+
+def is_validated(data: Any, model: Any) -> bool:
+    if get_origin(model) is list:
+        (model,) = get_args(model)
+        return isinstance(data, list) and all(type(row) is Validated and row.model is model for row in data)
+    return type(data) is Validated and data.model is model
+
+
+def serialize(data: Any, model: Any) -> bytes:
+    if settings.JSON_RESPONSE_MODE == "trusted" and is_validated(data, model):
+        return orjson.dumps(data)
+    adapter = get_adapter(model)
+    value = adapter.validate_python(data)
+    if settings.JSON_RESPONSE_MODE != "standard":
+        return adapter.dump_json(value)
+    return JSONResponse(content=adapter.dump_python(value, mode="json")).body
+
+
+def json_response(data: Any, model: Any) -> Response:
+    return Response(content=serialize(data, model), media_type="application/json")
+
+
+# Whole-catalog lists are encoded off the event loop in chunks, so each call into pydantic-core
+# holds the GIL only briefly and the loop keeps serving other requests meanwhile.
+def serialize_chunked(rows: list, model: Any) -> bytes:
+    size = settings.JSON_SERIALIZE_CHUNK_SIZE
+    chunks = (serialize(rows[start:start + size], list[model])[1:-1] for start in range(0, len(rows), size))
+    return b"[" + b",".join(chunks) + b"]"
+
+
+async def threadpool_json_response(rows: list, model: Any) -> Response:
+    return Response(content=await run_in_threadpool(serialize_chunked, rows, model), media_type="application/json")
+
+
+def build_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def cache_headers(entry: CachedResponse) -> dict[str, str]:
+    return {
+        **entry.headers,
+        "ETag": entry.etag,
+        "Last-Modified": format_datetime(entry.last_modified, usegmt=True),
+        "Cache-Control": f"public, max-age={settings.CATALOG_HTTP_MAX_AGE}, s-maxage={settings.CATALOG_HTTP_S_MAXAGE}",
+    }
+
+
+def stale_headers(entry: CachedResponse) -> dict[str, str]:
+    return {
+        **cache_headers(entry),
+        "Cache-Control": "no-cache",
+        "Age": str(int(time.time() - entry.created_at)),
+        "X-Catalog-Stale": "true",
+    }
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, entry: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, entry.etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return entry.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def cached_json_response(
+    request: Request,
+    key: Hashable,
+    model: Any,
+    load: Callable[[], Awaitable[tuple[Any, dict[str, str]]]],
+) -> Response:
+    entry = response_cache.get(key)
+    headers = None
+    if entry is None:
+        version = catalog_version.value
+        generation = response_cache.generation
+        try:
+            data, loaded_headers = await load()
+        except Exception as exc:
+            entry = stale_response_cache.get(key) if is_upstream_failure(exc) else None
+            if entry is None:
+                raise
+            logger.warning("serving_stale_response", path=request.url.path, error=str(exc) or type(exc).__name__)
+            headers = stale_headers(entry)
+        else:
+            body = serialize(data, model)
+            etag = build_etag(body)
+            previous = stale_response_cache.get(key)
+            if previous is not None and previous.etag == etag:
+                last_modified = previous.last_modified
+            else:
+                last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+            entry = CachedResponse(body, etag, last_modified, loaded_headers)
+            stale_response_cache.set(key, entry)
+            if catalog_version.value == version:
+                response_cache.set(key, entry, generation)
+
+    headers = headers or cache_headers(entry)
+    if is_not_modified(request, entry):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 
 class AdminLoginRequest(BaseModel):
@@ -17,12 +17,18 @@ class CategoryCreate(BaseModel):
 
 from datetime import datetime
 
+class ImageDerivative(BaseModel):
+    width: int
+    format: str
+    url: str
+
 class ProductImage(BaseModel):
     id: int
     product_id: int
     image_url: str
     is_primary: bool
     created_at: datetime
+    derivatives: list[ImageDerivative] = []
 
 class ProductVariant(BaseModel):
     id: int
@@ -30,6 +36,7 @@ class ProductVariant(BaseModel):
     name: str
     stock_quantity: int
     image_url: Optional[str] = None
+    image_derivatives: list[ImageDerivative] = []
 
 class Product(BaseModel):
     id: int
@@ -64,3 +71,74 @@ class ProductUpdate(BaseModel):
     stock_quantity: Optional[int] = None
     category_id: Optional[int] = None
 
+
+PRODUCT_FIELDS = frozenset({"category", "images", "primary_image", "variants"})
+DEFAULT_PRODUCT_FIELDS = frozenset({"category", "images", "variants"})
+
+class ProductQuery(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    limit: Optional[int] = None
+    after_id: Optional[int] = None
+    category_id: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: Optional[bool] = None
+    fields: frozenset[str] = DEFAULT_PRODUCT_FIELDS
+
+class CategoryUpsert(Category):
+    pass
+
+class ProductUpsert(ProductCreate):
+    id: int
+
+class ProductVariantBulkCreate(ProductVariantCreate):
+    product_id: int
+
+class ProductVariantUpsert(ProductVariantBulkCreate):
+    id: int
+
+class BulkDeleteRequest(BaseModel):
+    ids: list[int]
+
+class BulkDeleteResult(BaseModel):
+    deleted: int
+
+class ProductImportRow(ProductCreate):
+    id: Optional[int] = None
+
+class ProductVariantImportRow(ProductVariantBulkCreate):
+    id: Optional[int] = None
+
+class CategoryImportRow(CategoryCreate):
+    id: Optional[int] = None
+
+class ImportRowError(BaseModel):
+    row: int
+    errors: list[str]
+
+class ImportReport(BaseModel):
+    processed: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    chunks: int = 0
+    errors: list[ImportRowError] = []
+    errors_truncated: bool = False
+    aborted: bool = False
+    abort_reason: Optional[str] = None
+
+class ReservationLine(BaseModel):
+    product_id: int = Field(gt=0, le=9223372036854775807)
+    variant_id: Optional[int] = Field(None, gt=0, le=9223372036854775807)
+    quantity: int = Field(gt=0, le=2147483647)
+
+class ReservationCreate(BaseModel):
+    items: list[ReservationLine] = Field(min_length=1)
+
+class CartToken(BaseModel):
+    cart_token: str
+    expires_at: datetime
+
+class Reservation(BaseModel):
+    id: str
+    expires_at: datetime
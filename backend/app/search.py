@@ -0,0 +1,303 @@
+import asyncio
+import bisect
+import heapq
+import math
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+import structlog
+
+from .config import settings
+from .supabase_client import SupabaseClient, execute, get_supabase
+
+logger = structlog.get_logger(__name__)
+
+FIELD_WEIGHTS = {"name": 3.0, "category": 1.5, "variants": 1.5, "description": 1.0}
+PREFIX_WEIGHT = 0.6
+INDEX_SELECT = "id,name,description,category_id,category:categories(name),product_variants(name)"
+
+TOKEN_RE = re.compile(r"\w+")
+
+_FOLD = str.maketrans({
+    "ـ": None,  # tatweel
+    "ٱ": "ا",  # alef wasla -> alef
+    "ى": "ي",  # alef maksura -> yeh
+    "ی": "ي",  # farsi yeh -> yeh
+    "ة": "ه",  # teh marbuta -> heh
+    "ک": "ك",  # keheh -> kaf
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+})
+
+
+def normalize(text: str) -> str:
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).translate(_FOLD).casefold()
+
+
+def tokenize(text: str | None) -> list[str]:
+    return TOKEN_RE.findall(normalize(text)) if text else []
+
+
+@dataclass(frozen=True)
+class IndexedProduct:
+    category_id: int | None
+    terms: dict[str, float]
+
+
+class SearchIndex:
+    def __init__(self):
+        self._postings: dict[str, dict[int, float]] = {}
+        self._terms: list[str] = []
+        self._documents: dict[int, IndexedProduct] = {}
+        self._category_members: defaultdict[int, set[int]] = defaultdict(set)
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @staticmethod
+    def _document_terms(product: dict) -> dict[str, float]:
+        fields = (
+            ("name", product.get("name")),
+            ("description", product.get("description")),
+            ("category", (product.get("category") or {}).get("name")),
+            ("variants", " ".join(variant["name"] for variant in product.get("product_variants") or [])),
+        )
+        terms: dict[str, float] = {}
+        for field, text in fields:
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                if terms.get(token, 0.0) < weight:
+                    terms[token] = weight
+        return terms
+
+    def _remove(self, product_id: int, removed_terms: list[str]) -> None:
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        for term in document.terms:
+            postings = self._postings[term]
+            del postings[product_id]
+            if not postings:
+                del self._postings[term]
+                removed_terms.append(term)
+        if document.category_id is not None:
+            self._category_members[document.category_id].discard(product_id)
+
+    def _rebuild_terms(self, added: list[str], removed: list[str]) -> None:
+        if len(added) + len(removed) > 32:
+            self._terms = sorted(self._postings)
+            return
+        for term in removed:
+            index = bisect.bisect_left(self._terms, term)
+            if index < len(self._terms) and self._terms[index] == term:
+                del self._terms[index]
+        for term in added:
+            bisect.insort(self._terms, term)
+
+    def add_many(self, products: Iterable[dict]) -> None:
+        added: list[str] = []
+        removed: list[str] = []
+        for product in products:
+            product_id = product["id"]
+            self._remove(product_id, removed)
+            terms = self._document_terms(product)
+            for term, weight in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    added.append(term)
+                postings[product_id] = weight
+            category_id = product.get("category_id")
+            self._documents[product_id] = IndexedProduct(category_id, terms)
+            if category_id is not None:
+                self._category_members[category_id].add(product_id)
+        self._rebuild_terms([term for term in added if term in self._postings], removed)
+
+    def remove_many(self, product_ids: Iterable[int]) -> None:
+        removed: list[str] = []
+        for product_id in product_ids:
+            self._remove(product_id, removed)
+        self._rebuild_terms([], [term for term in removed if term not in self._postings])
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._terms.clear()
+        self._documents.clear()
+        self._category_members.clear()
+
+    def replace(self, other: "SearchIndex") -> None:
+        self._postings = other._postings
+        self._terms = other._terms
+        self._documents = other._documents
+        self._category_members = other._category_members
+
+    def products_in_category(self, category_id: int) -> set[int]:
+        return set(self._category_members.get(category_id, ()))
+
+    def _expand(self, token: str) -> Iterator[tuple[str, float]]:
+        # Tokens too short to be a useful prefix match whole terms only; "l" would otherwise score most of the catalog.
+        if len(token) < settings.SEARCH_MIN_PREFIX_LENGTH:
+            if token in self._postings:
+                yield token, 1.0
+            return
+        start = bisect.bisect_left(self._terms, token)
+        end = min(start + settings.SEARCH_MAX_PREFIX_TERMS, len(self._terms))
+        for index in range(start, end):
+            term = self._terms[index]
+            if not term.startswith(token):
+                break
+            yield term, 1.0 if term == token else PREFIX_WEIGHT
+
+    def _token_scores(self, token: str, candidates: dict[int, float] | None) -> dict[int, float]:
+        total = len(self._documents)
+        scores: dict[int, float] = {}
+        for term, factor in self._expand(token):
+            postings = self._postings[term]
+            idf = math.log(1 + total / len(postings))
+            if candidates is not None and len(candidates) < len(postings):
+                matches = ((product_id, postings[product_id]) for product_id in candidates if product_id in postings)
+            else:
+                matches = postings.items()
+            for product_id, weight in matches:
+                score = weight * factor * idf
+                if score > scores.get(product_id, 0.0):
+                    scores[product_id] = score
+        return scores
+
+    def search(self, query: str, limit: int, offset: int = 0) -> tuple[int, list[int]]:
+        scores: dict[int, float] | None = None
+        for token in dict.fromkeys(tokenize(query)):
+            token_scores = self._token_scores(token, scores)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {product_id: score + token_scores[product_id] for product_id, score in scores.items() if product_id in token_scores}
+            if not scores:
+                return 0, []
+        if scores is None:
+            return 0, []
+        ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return len(scores), [product_id for product_id, _ in ranked[offset:]]
+
+    def stats(self) -> dict:
+        return {"ready": self.ready, "documents": len(self._documents), "terms": len(self._terms)}
+
+
+class SearchIndexer:
+    def __init__(self, index: SearchIndex):
+        self.index = index
+        self._dirty_products: set[int] = set()
+        self._dirty_categories: set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def mark_products(self, product_ids: Iterable[int]) -> None:
+        if self._task is not None:
+            self._dirty_products.update(product_ids)
+            self._wakeup.set()
+
+    def mark_categories(self, category_ids: Iterable[int]) -> None:
+        if self._task is not None:
+            self._dirty_categories.update(category_ids)
+            self._wakeup.set()
+
+    async def _load(self, supabase: SupabaseClient, index: SearchIndex) -> None:
+        last_id = 0
+        while True:
+            response = await execute(
+                supabase.table("products")
+                .select(INDEX_SELECT)
+                .gt("id", last_id)
+                .order("id")
+                .limit(settings.SEARCH_INDEX_BATCH_SIZE)
+            )
+            if not response.data:
+                break
+            index.add_many(response.data)
+            last_id = response.data[-1]["id"]
+            await asyncio.sleep(0)
+
+    async def build(self, supabase: SupabaseClient) -> None:
+        self.index.clear()
+        await self._load(supabase, self.index)
+        self.index.ready = True
+        logger.info("search_index_built", **self.index.stats())
+
+    # Without realtime, writes made by other workers only reach this index through a periodic full resync.
+    async def resync(self, supabase: SupabaseClient) -> None:
+        fresh = SearchIndex()
+        await self._load(supabase, fresh)
+        self.index.replace(fresh)
+        logger.info("search_index_resynced", **self.index.stats())
+
+    async def refresh(self, supabase: SupabaseClient) -> None:
+        product_ids, self._dirty_products = self._dirty_products, set()
+        category_ids, self._dirty_categories = self._dirty_categories, set()
+        try:
+            for category_id in category_ids:
+                product_ids |= self.index.products_in_category(category_id)
+            ordered = sorted(product_ids)
+            for start in range(0, len(ordered), settings.SEARCH_INDEX_BATCH_SIZE):
+                chunk = ordered[start:start + settings.SEARCH_INDEX_BATCH_SIZE]
+                response = await execute(supabase.table("products").select(INDEX_SELECT).in_("id", chunk))
+                self.index.add_many(response.data)
+                self.index.remove_many(set(chunk) - {row["id"] for row in response.data})
+                product_ids.difference_update(chunk)
+        except Exception:
+            self._dirty_products |= product_ids
+            raise
+
+    async def _run(self) -> None:
+        supabase = await get_supabase()
+        while not self.index.ready:
+            try:
+                await self.build(supabase)
+            except Exception as exc:
+                logger.warning("search_index_build_failed", error=str(exc))
+                await asyncio.sleep(5)
+        resync_every = None if settings.CATALOG_REALTIME_ENABLED or settings.SEARCH_RESYNC_SECONDS <= 0 else settings.SEARCH_RESYNC_SECONDS
+        resync_at = time.monotonic() + resync_every if resync_every else None
+        while True:
+            try:
+                async with asyncio.timeout(None if resync_at is None else max(0.0, resync_at - time.monotonic())):
+                    await self._wakeup.wait()
+            except asyncio.TimeoutError:
+                try:
+                    await self.resync(supabase)
+                except Exception as exc:
+                    logger.warning("search_index_resync_failed", error=str(exc))
+                resync_at = time.monotonic() + resync_every
+                continue
+            self._wakeup.clear()
+            try:
+                await self.refresh(supabase)
+            except Exception as exc:
+                logger.warning("search_index_refresh_failed", error=str(exc))
+                await asyncio.sleep(1)
+                self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self.index.ready = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+search_index = SearchIndex()
+search_indexer = SearchIndexer(search_index)
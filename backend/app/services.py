@@ -1,133 +1,341 @@
-from supabase import Client
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from jose import jwt, JWTError
+import base64
+import secrets
+import binascii
+from typing import Iterable
 from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordBearer
 
 from . import schemas
 from .config import settings
-from .supabase_client import get_supabase_client
+from .supabase_client import SupabaseClient, get_supabase, execute
+from .cache import catalog_cache, response_cache, search_cache, bump_catalog_version
+from .singleflight import catalog_flights
+from .search import search_indexer
+from .events import catalog_events
+from .tokens import token_cache, token_generation
+from .responses import mark_validated
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
-def get_current_admin_user(token: str = Depends(oauth2_scheme)):
+async def get_current_admin_user(token: str = Depends(oauth2_scheme), supabase: SupabaseClient = Depends(get_supabase)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            raise credentials_exception
+        if payload.get("sub") is None:
             raise credentials_exception
-    except JWTError:
+        token_cache.set(token, payload)
+    if payload.get("gen") != await token_generation.current(supabase):
         raise credentials_exception
-    return {"email": email}
+    return {"email": payload["sub"]}
+
+# Metrics and internal health endpoints: a scraper presents METRICS_TOKEN, anyone else needs an admin token.
+async def require_metrics_access(request: Request, supabase: SupabaseClient = Depends(get_supabase)):
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if settings.METRICS_TOKEN and scheme.lower() == "bearer" and secrets.compare_digest(token, settings.METRICS_TOKEN):
+        return
+    await get_current_admin_user(await oauth2_scheme(request), supabase)
 
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
+def create_access_token(data: dict, expires_delta: timedelta | None = None, generation: int = 0):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "gen": generation})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_categories(supabase: Client = Depends(get_supabase_client)) -> list[schemas.Category]:
-    response = supabase.table("categories").select("*").execute()
-    return response.data
+CATEGORIES_KEY = ("categories",)
 
-def get_category(category_id: int, supabase: Client = Depends(get_supabase_client)) -> schemas.Category | None:
-    response = supabase.table("categories").select("*").eq("id", category_id).execute()
-    return response.data[0] if response.data else None
+CATEGORY_COLUMNS = ",".join(schemas.Category.model_fields)
+PRODUCT_IMAGE_COLUMNS = ",".join(schemas.ProductImage.model_fields)
+PRODUCT_VARIANT_COLUMNS = ",".join(schemas.ProductVariant.model_fields)
+PRODUCT_COLUMNS = ",".join(
+    name for name in schemas.Product.model_fields if name not in ("category", "product_images", "product_variants")
+)
 
-def create_category(category: schemas.CategoryCreate, supabase: Client = Depends(get_supabase_client)) -> schemas.Category:
-    response = supabase.table("categories").insert(category.model_dump()).execute()
-    return response.data[0]
+def build_product_select(fields: frozenset[str] = schemas.DEFAULT_PRODUCT_FIELDS) -> str:
+    columns = [PRODUCT_COLUMNS]
+    if "category" in fields:
+        columns.append(f"category:categories({CATEGORY_COLUMNS})")
+    if "images" in fields or "primary_image" in fields:
+        columns.append(f"product_images({PRODUCT_IMAGE_COLUMNS})")
+    if "variants" in fields:
+        columns.append(f"product_variants({PRODUCT_VARIANT_COLUMNS})")
+    return ",".join(columns)
 
-def update_category(category_id: int, category: schemas.CategoryCreate, supabase: Client = Depends(get_supabase_client)) -> schemas.Category | None:
-    response = supabase.table("categories").update(category.model_dump()).eq("id", category_id).execute()
-    return response.data[0] if response.data else None
+def _complete_product_row(row: dict) -> dict:
+    row.setdefault("category", None)
+    row.setdefault("product_images", [])
+    row.setdefault("product_variants", [])
+    return row
 
-def delete_category(category_id: int, supabase: Client = Depends(get_supabase_client)) -> bool:
-    response = supabase.table("categories").delete().eq("id", category_id).execute()
-    return bool(response.data)
+def encode_cursor(product_id: int) -> str:
+    return base64.urlsafe_b64encode(str(product_id).encode()).decode().rstrip("=")
 
-def get_products(supabase: Client = Depends(get_supabase_client)) -> list[schemas.Product]:
-    response = supabase.table("products").select("*, category:categories(*), product_images(*), product_variants(*)").execute()
-    return response.data
+def decode_cursor(cursor: str) -> int:
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        offset = -1
+    if offset < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return offset
 
-def get_product(product_id: int, supabase: Client = Depends(get_supabase_client)) -> schemas.Product | None:
-    response = supabase.table("products").select("*, category:categories(*), product_images(*), product_variants(*)").eq("id", product_id).execute()
-    return response.data[0] if response.data else None
+def products_key(query: schemas.ProductQuery) -> tuple:
+    return ("products", query)
+
+def _is_products_key(key: tuple, value=None) -> bool:
+    return key[0] == "products"
+
+def product_key(product_id: int) -> tuple:
+    return ("product", product_id)
+
+def category_key(category_id: int) -> tuple:
+    return ("category", category_id)
+
+async def _read_through(key: tuple, load, model, cache=catalog_cache):
+    async def fill():
+        return mark_validated(await load(), model)
+    return await cache.get_or_load(key, lambda: catalog_flights.do(key, fill))
+
+def invalidate_products(product_ids: Iterable[int]) -> None:
+    product_ids = set(product_ids)
+    keys = [product_key(product_id) for product_id in product_ids]
+    bump_catalog_version()
+    catalog_cache.invalidate(*keys)
+    catalog_cache.invalidate_where(_is_products_key)
+    search_cache.clear()
+    catalog_flights.forget(*keys)
+    catalog_flights.forget_where(_is_products_key)
+    search_indexer.mark_products(product_ids)
+
+# Stock-only writes drop just the affected product entries; listings pick up new stock levels on TTL expiry.
+def invalidate_product_stock(product_ids: Iterable[int]) -> None:
+    keys = [product_key(product_id) for product_id in set(product_ids)]
+    catalog_cache.invalidate(*keys)
+    catalog_flights.forget(*keys)
+    response_cache.invalidate(*keys)
+
+def invalidate_product(product_id: int) -> None:
+    invalidate_products([product_id])
+
+def invalidate_new_categories(category_ids: Iterable[int]) -> None:
+    keys = [category_key(category_id) for category_id in set(category_ids)]
+    bump_catalog_version()
+    catalog_cache.invalidate(CATEGORIES_KEY, *keys)
+    catalog_flights.forget(CATEGORIES_KEY, *keys)
+
+def invalidate_new_category(category_id: int) -> None:
+    invalidate_new_categories([category_id])
+
+def invalidate_categories(category_ids: Iterable[int]) -> None:
+    category_ids = set(category_ids)
+    bump_catalog_version()
+    catalog_cache.invalidate(CATEGORIES_KEY, *[category_key(category_id) for category_id in category_ids])
+    catalog_cache.invalidate_where(
+        lambda key, value: _is_products_key(key)
+        or (key[0] == "product" and value is not None and value.get("category_id") in category_ids)
+    )
+    search_cache.clear()
+    catalog_flights.forget_all()
+    search_indexer.mark_categories(category_ids)
+
+def invalidate_category(category_id: int) -> None:
+    invalidate_categories([category_id])
 
-def create_product(product: schemas.ProductCreate, supabase: Client = Depends(get_supabase_client)) -> schemas.Product:
-    response = supabase.table("products").insert(product.model_dump()).execute()
+def _invalidate_product_rows(rows: list[dict]) -> None:
+    if rows:
+        invalidate_products(row["product_id"] for row in rows)
+
+async def get_categories(supabase: SupabaseClient = Depends(get_supabase)) -> list[schemas.Category]:
+    async def load():
+        response = await execute(supabase.table("categories").select(CATEGORY_COLUMNS))
+        return response.data
+    return await _read_through(CATEGORIES_KEY, load, schemas.Category)
+
+async def get_category(category_id: int, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.Category | None:
+    async def load():
+        response = await execute(supabase.table("categories").select(CATEGORY_COLUMNS).eq("id", category_id))
+        return response.data[0] if response.data else None
+    return await _read_through(category_key(category_id), load, schemas.Category)
+
+async def create_category(category: schemas.CategoryCreate, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.Category:
+    response = await execute(supabase.table("categories").insert(category.model_dump()))
+    catalog_events.publish("categories", "upsert", response.data)
+    invalidate_new_category(response.data[0]["id"])
     return response.data[0]
 
-def update_product(product_id: int, product: schemas.ProductUpdate, supabase: Client = Depends(get_supabase_client)) -> schemas.Product | None:
-    response = supabase.table("products").update(product.model_dump(exclude_unset=True)).eq("id", product_id).execute()
+async def update_category(category_id: int, category: schemas.CategoryCreate, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.Category | None:
+    response = await execute(supabase.table("categories").update(category.model_dump()).eq("id", category_id))
+    catalog_events.publish("categories", "upsert", response.data)
+    if response.data:
+        invalidate_category(category_id)
     return response.data[0] if response.data else None
 
-def delete_product(product_id: int, supabase: Client = Depends(get_supabase_client)) -> bool:
-    response = supabase.table("products").delete().eq("id", product_id).execute()
+async def delete_category(category_id: int, supabase: SupabaseClient = Depends(get_supabase)) -> bool:
+    response = await execute(supabase.table("categories").delete().eq("id", category_id))
+    catalog_events.publish("categories", "delete", response.data)
+    if response.data:
+        invalidate_category(category_id)
     return bool(response.data)
 
-def create_product_image(product_id: int, image_url: str, supabase: Client = Depends(get_supabase_client)) -> schemas.ProductImage:
-    existing_primary_image = supabase.table("product_images").select("id").eq("product_id", product_id).eq("is_primary", True).execute()
-    is_primary = not existing_primary_image.data
-    response = supabase.table("product_images").insert({"product_id": product_id, "image_url": image_url, "is_primary": is_primary}).execute()
-    return response.data[0]
-
-def delete_product_image(image_id: int, supabase: Client = Depends(get_supabase_client)) -> bool:
-    image_response = supabase.table("product_images").select("image_url, product_id, is_primary").eq("id", image_id).execute()
-    if not image_response.data:
-        return False
+async def get_products(query: schemas.ProductQuery = schemas.ProductQuery(), supabase: SupabaseClient = Depends(get_supabase)) -> list[schemas.Product]:
+    async def load():
+        request = supabase.table("products").select(build_product_select(query.fields))
+        if query.after_id is not None:
+            request = request.gt("id", query.after_id)
+        if query.category_id is not None:
+            request = request.eq("category_id", query.category_id)
+        if query.min_price is not None:
+            request = request.gte("price", query.min_price)
+        if query.max_price is not None:
+            request = request.lte("price", query.max_price)
+        if query.in_stock is True:
+            request = request.gt("stock_quantity", 0)
+        elif query.in_stock is False:
+            request = request.lte("stock_quantity", 0)
+        if "primary_image" in query.fields and "images" not in query.fields:
+            request = request.eq("product_images.is_primary", True)
+        request = request.order("id")
+        if query.limit is not None:
+            request = request.limit(query.limit + 1)
+        response = await execute(request)
+        return [_complete_product_row(row) for row in response.data]
+    return await _read_through(products_key(query), load, schemas.Product)
 
-    image_data = image_response.data[0]
-    image_url = image_data["image_url"]
-    product_id = image_data["product_id"]
-    was_primary = image_data["is_primary"]
+async def get_product_page(query: schemas.ProductQuery, supabase: SupabaseClient = Depends(get_supabase)) -> tuple[list[schemas.Product], str | None]:
+    products = await get_products(query=query, supabase=supabase)
+    if query.limit is None or len(products) <= query.limit:
+        return products, None
+    products = products[:query.limit]
+    return products, encode_cursor(products[-1]["id"])
 
-    file_path = "/".join(image_url.split("/")[-2:])
+async def get_product(product_id: int, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.Product | None:
+    async def load():
+        response = await execute(supabase.table("products").select(build_product_select()).eq("id", product_id))
+        return _complete_product_row(response.data[0]) if response.data else None
+    return await _read_through(product_key(product_id), load, schemas.Product)
 
-    supabase.storage.from_("products").remove([file_path])
+async def get_products_by_ids(product_ids: list[int], fields: frozenset[str] = schemas.DEFAULT_PRODUCT_FIELDS, supabase: SupabaseClient = Depends(get_supabase)) -> list[schemas.Product]:
+    async def load():
+        request = supabase.table("products").select(build_product_select(fields)).in_("id", product_ids)
+        if "primary_image" in fields and "images" not in fields:
+            request = request.eq("product_images.is_primary", True)
+        response = await execute(request)
+        rows = {row["id"]: _complete_product_row(row) for row in response.data}
+        return [rows[product_id] for product_id in product_ids if product_id in rows]
+    if not product_ids:
+        return []
+    return await _read_through(("products", tuple(product_ids), fields), load, schemas.Product, search_cache)
 
-    response = supabase.table("product_images").delete().eq("id", image_id).execute()
+async def create_product(product: schemas.ProductCreate, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.Product:
+    response = await execute(supabase.table("products").insert(product.model_dump()))
+    catalog_events.publish("products", "upsert", response.data)
+    invalidate_product(response.data[0]["id"])
+    return response.data[0]
 
-    if was_primary:
-        remaining_images = supabase.table("product_images").select("id").eq("product_id", product_id).order("created_at").execute()
-        if remaining_images.data:
-            new_primary_id = remaining_images.data[0]["id"]
-            supabase.table("product_images").update({"is_primary": True}).eq("id", new_primary_id).execute()
+async def update_product(product_id: int, product: schemas.ProductUpdate, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.Product | None:
+    response = await execute(supabase.table("products").update(product.model_dump(exclude_unset=True)).eq("id", product_id))
+    catalog_events.publish("products", "upsert", response.data)
+    if response.data:
+        invalidate_product(product_id)
+    return response.data[0] if response.data else None
 
+async def delete_product(product_id: int, supabase: SupabaseClient = Depends(get_supabase)) -> bool:
+    response = await execute(supabase.table("products").delete().eq("id", product_id))
+    catalog_events.publish("products", "delete", response.data)
+    if response.data:
+        invalidate_product(product_id)
     return bool(response.data)
 
-def set_primary_image(image_id: int, supabase: Client = Depends(get_supabase_client)) -> schemas.ProductImage | None:
-    image_response = supabase.table("product_images").select("product_id").eq("id", image_id).execute()
-    if not image_response.data:
-        return None
-    product_id = image_response.data[0]["product_id"]
+async def create_product_image(product_id: int, image_url: str, derivatives: list[dict] | None = None, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.ProductImage:
+    response = await execute(supabase.rpc("create_product_image", {"p_product_id": product_id, "p_image_url": image_url, "p_derivatives": derivatives or []}))
+    catalog_events.publish("product_images", "upsert", response.data)
+    invalidate_product(product_id)
+    return response.data[0]
 
-    supabase.table("product_images").update({"is_primary": False}).eq("product_id", product_id).execute()
+async def delete_product_image(image_id: int, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.ProductImage | None:
+    response = await execute(supabase.rpc("delete_product_image", {"p_image_id": image_id}))
+    catalog_events.publish("product_images", "delete", response.data)
+    if not response.data:
+        return None
+    invalidate_product(response.data[0]["product_id"])
+    return response.data[0]
 
-    response = supabase.table("product_images").update({"is_primary": True}).eq("id", image_id).execute()
-    return response.data[0] if response.data else None
+async def set_primary_image(image_id: int, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.ProductImage | None:
+    response = await execute(supabase.rpc("set_primary_product_image", {"p_image_id": image_id}))
+    catalog_events.publish("product_images", "upsert", response.data)
+    if not response.data:
+        return None
+    invalidate_product(response.data[0]["product_id"])
+    return response.data[0]
 
-def create_product_variant(product_id: int, variant: schemas.ProductVariantCreate, supabase: Client = Depends(get_supabase_client)) -> schemas.ProductVariant:
-    response = supabase.table("product_variants").insert({"product_id": product_id, **variant.model_dump()}).execute()
+async def create_product_variant(product_id: int, variant: schemas.ProductVariantCreate, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.ProductVariant:
+    response = await execute(supabase.table("product_variants").insert({"product_id": product_id, **variant.model_dump()}))
+    catalog_events.publish("product_variants", "upsert", response.data)
+    invalidate_product(product_id)
     return response.data[0]
 
-def update_product_variant(variant_id: int, variant: schemas.ProductVariantUpdate, supabase: Client = Depends(get_supabase_client)) -> schemas.ProductVariant | None:
-    response = supabase.table("product_variants").update(variant.model_dump(exclude_unset=True)).eq("id", variant_id).execute()
+async def update_product_variant(variant_id: int, variant: schemas.ProductVariantUpdate, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.ProductVariant | None:
+    response = await execute(supabase.table("product_variants").update(variant.model_dump(exclude_unset=True)).eq("id", variant_id))
+    catalog_events.publish("product_variants", "upsert", response.data)
+    _invalidate_product_rows(response.data)
     return response.data[0] if response.data else None
 
-def delete_product_variant(variant_id: int, supabase: Client = Depends(get_supabase_client)) -> bool:
-    response = supabase.table("product_variants").delete().eq("id", variant_id).execute()
+async def delete_product_variant(variant_id: int, supabase: SupabaseClient = Depends(get_supabase)) -> bool:
+    response = await execute(supabase.table("product_variants").delete().eq("id", variant_id))
+    catalog_events.publish("product_variants", "delete", response.data)
+    _invalidate_product_rows(response.data)
     return bool(response.data)
 
-def update_product_variant_image(variant_id: int, image_url: str, supabase: Client = Depends(get_supabase_client)) -> schemas.ProductVariant | None:
-    response = supabase.table("product_variants").update({"image_url": image_url}).eq("id", variant_id).execute()
+async def update_product_variant_image(variant_id: int, image_url: str, image_derivatives: list[dict] | None = None, supabase: SupabaseClient = Depends(get_supabase)) -> schemas.ProductVariant | None:
+    response = await execute(supabase.table("product_variants").update({"image_url": image_url, "image_derivatives": image_derivatives or []}).eq("id", variant_id))
+    catalog_events.publish("product_variants", "upsert", response.data)
+    _invalidate_product_rows(response.data)
     return response.data[0] if response.data else None
+
+BULK_TABLES = {
+    "products": lambda rows: invalidate_products(row["id"] for row in rows),
+    "product_variants": _invalidate_product_rows,
+    "categories": lambda rows: invalidate_categories(row["id"] for row in rows),
+}
+
+def _chunks(items: list, size: int) -> Iterable[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+async def bulk_write(table: str, rows: list[dict], upsert: bool = False, chunk_size: int | None = None, supabase: SupabaseClient = Depends(get_supabase)) -> list[dict]:
+    written = []
+    try:
+        for chunk in _chunks(rows, chunk_size or settings.BULK_CHUNK_SIZE):
+            request = supabase.table(table).upsert(chunk) if upsert else supabase.table(table).insert(chunk)
+            response = await execute(request)
+            written.extend(response.data)
+            catalog_events.publish(table, "upsert", response.data)
+    finally:
+        if written:
+            BULK_TABLES[table](written)
+    return written
+
+async def bulk_delete(table: str, ids: list[int], supabase: SupabaseClient = Depends(get_supabase)) -> list[dict]:
+    deleted = []
+    try:
+        for chunk in _chunks(sorted(set(ids)), settings.BULK_CHUNK_SIZE):
+            response = await execute(supabase.table(table).delete().in_("id", chunk))
+            deleted.extend(response.data)
+            catalog_events.publish(table, "delete", response.data)
+    finally:
+        if deleted:
+            BULK_TABLES[table](deleted)
+    return deleted
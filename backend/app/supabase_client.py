@@ -1,5 +1,199 @@
-from supabase import create_client, Client
+import inspect
+import threading
+from typing import Any, Callable, Union
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from supabase import create_client, Client, AClient
 from .config import settings
+from .metrics import observe_upstream, postgrest_labels
+from .resilience import postgrest_breaker
+
+SupabaseClient = Union[Client, AClient]
+
+_client: Client | None = None
+_transport: httpx.BaseTransport | None = None
+_async_client: AClient | None = None
+_async_transport: httpx.AsyncBaseTransport | None = None
+_lock = threading.Lock()
+_transport_overrides: tuple[httpx.BaseTransport | None, httpx.AsyncBaseTransport | None] = (None, None)
+
+
+def use_transports(transport: httpx.BaseTransport | None = None, async_transport: httpx.AsyncBaseTransport | None = None) -> None:
+    global _transport_overrides
+    _transport_overrides = (transport, async_transport)
+
+
+def _build_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.SUPABASE_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def _build_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.SUPABASE_READ_TIMEOUT,
+        connect=settings.SUPABASE_CONNECT_TIMEOUT,
+        pool=settings.SUPABASE_POOL_TIMEOUT,
+    )
+
+
+def _rebind_session(session, transport):
+    return type(session)(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=_build_timeout(),
+        follow_redirects=True,
+        transport=transport,
+    )
+
+
+def _create_pooled_client() -> tuple[Client, httpx.BaseTransport]:
+    transport = _transport_overrides[0] or httpx.HTTPTransport(http2=settings.SUPABASE_HTTP2, limits=_build_limits())
+    client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+
+    postgrest = client.postgrest
+    default_session = postgrest.session
+    postgrest.session = _rebind_session(default_session, transport)
+    default_session.close()
+
+    storage = client.storage
+    default_session = storage.session
+    storage.session = _rebind_session(default_session, transport)
+    storage._client = storage.session
+    default_session.close()
+
+    return client, transport
+
+
+async def _create_async_pooled_client() -> tuple[AClient, httpx.AsyncBaseTransport]:
+    transport = _transport_overrides[1] or httpx.AsyncHTTPTransport(http2=settings.SUPABASE_HTTP2, limits=_build_limits())
+    client = AClient(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+
+    postgrest = client.postgrest
+    default_session = postgrest.session
+    postgrest.session = _rebind_session(default_session, transport)
+    await default_session.aclose()
+
+    storage = client.storage
+    default_session = storage.session
+    storage.session = _rebind_session(default_session, transport)
+    storage._client = storage.session
+    await default_session.aclose()
+
+    return client, transport
+
+
+def init_supabase_client() -> Client:
+    global _client, _transport
+    with _lock:
+        if _client is None:
+            _client, _transport = _create_pooled_client()
+        return _client
+
+
+def close_supabase_client() -> None:
+    global _client, _transport
+    with _lock:
+        if _client is not None:
+            _client.postgrest.session.close()
+            _client.storage.session.close()
+        if _transport is not None:
+            _transport.close()
+        _client = None
+        _transport = None
+
+
+async def init_async_supabase_client() -> AClient:
+    global _async_client, _async_transport
+    if _async_client is None:
+        _async_client, _async_transport = await _create_async_pooled_client()
+    return _async_client
+
+
+async def close_async_supabase_client() -> None:
+    global _async_client, _async_transport
+    if _async_client is not None:
+        await _async_client.postgrest.session.aclose()
+        await _async_client.storage.session.aclose()
+    if _async_transport is not None:
+        await _async_transport.aclose()
+    _async_client = None
+    _async_transport = None
+
+
+async def init_clients() -> None:
+    if settings.SUPABASE_CLIENT_MODE == "async":
+        await init_async_supabase_client()
+    else:
+        init_supabase_client()
+
+
+async def close_clients() -> None:
+    await close_async_supabase_client()
+    close_supabase_client()
+
 
 def get_supabase_client() -> Client:
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    if _client is None:
+        return init_supabase_client()
+    return _client
+
+
+async def get_async_supabase_client() -> AClient:
+    if _async_client is None:
+        return await init_async_supabase_client()
+    return _async_client
+
+
+async def get_supabase() -> SupabaseClient:
+    if settings.SUPABASE_CLIENT_MODE == "async":
+        return await get_async_supabase_client()
+    return get_supabase_client()
+
+
+async def run_client_call(func: Callable[..., Any], *args, **kwargs) -> Any:
+    if inspect.iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    return await run_in_threadpool(func, *args, **kwargs)
+
+
+IDEMPOTENT_OPERATIONS = frozenset({"select", "count", "update", "delete", "upsert"})
+
+
+async def execute(query, retry: bool | None = None) -> Any:
+    target, operation = postgrest_labels(query)
+
+    async def attempt():
+        with observe_upstream("postgrest", target, operation):
+            return await run_client_call(query.execute)
+
+    return await postgrest_breaker.call(attempt, retry=operation in IDEMPOTENT_OPERATIONS if retry is None else retry)
+
+
+def get_pool_stats() -> dict:
+    transport = _async_transport if settings.SUPABASE_CLIENT_MODE == "async" else _transport
+    stats = {
+        "mode": settings.SUPABASE_CLIENT_MODE,
+        "initialized": transport is not None,
+        "http2": settings.SUPABASE_HTTP2,
+        "max_connections": settings.SUPABASE_POOL_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.SUPABASE_POOL_MAX_KEEPALIVE,
+        "connections": 0,
+        "active": 0,
+        "idle": 0,
+        "http2_connections": 0,
+        "queued_requests": 0,
+    }
+    pool = getattr(transport, "_pool", None)
+    if pool is None:
+        return stats
+
+    connections = list(pool.connections)
+    stats["connections"] = len(connections)
+    stats["idle"] = sum(1 for conn in connections if conn.is_idle())
+    stats["active"] = stats["connections"] - stats["idle"]
+    stats["http2_connections"] = sum(1 for conn in connections if "HTTP/2" in repr(conn))
+    stats["queued_requests"] = sum(1 for request in list(pool._requests) if request.is_queued())
+    return stats
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+import structlog
+from fastapi import HTTPException, status
+
+from .config import settings
+from .supabase_client import SupabaseClient, execute
+
+logger = structlog.get_logger(__name__)
+
+
+class TokenCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple[dict, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> dict | None:
+        key = self.digest(token)
+        entry = self._entries.get(key)
+        if entry is None or time.time() >= entry[1]:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, token: str, payload: dict) -> None:
+        expires_at = payload.get("exp")
+        if self.max_entries <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = self.digest(token)
+        self._entries[key] = (payload, float(expires_at))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "generation": token_generation.value,
+        }
+
+
+class TokenGeneration:
+    def __init__(self):
+        self.value: int | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self.value is not None and time.monotonic() - self._checked_at < settings.AUTH_GENERATION_REFRESH_SECONDS
+
+    def _update(self, value: int) -> None:
+        if value != self.value:
+            token_cache.clear()
+        self.value = value
+        self._checked_at = time.monotonic()
+
+    async def current(self, supabase: SupabaseClient) -> int:
+        if self._is_fresh():
+            return self.value
+        async with self._lock:
+            if self._is_fresh():
+                return self.value
+            try:
+                response = await execute(supabase.table("auth_state").select("token_generation").eq("id", 1))
+            except Exception as exc:
+                if self.value is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="Authentication state is unavailable",
+                    )
+                logger.warning("token_generation_refresh_failed", error=str(exc))
+                self._update(self.value)
+            else:
+                self._update(response.data[0]["token_generation"] if response.data else 0)
+        return self.value
+
+    async def bump(self, supabase: SupabaseClient) -> int:
+        response = await execute(supabase.rpc("bump_token_generation", {}))
+        self._update(response.data)
+        return self.value
+
+
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_MAX_ENTRIES)
+token_generation = TokenGeneration()
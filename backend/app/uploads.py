@@ -0,0 +1,179 @@
+import asyncio
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Iterator
+
+import httpx
+import structlog
+from fastapi import HTTPException, Request, UploadFile, status
+from fastapi.routing import APIRoute
+from storage3.utils import StorageException
+
+from .config import settings
+from .metrics import observe_upstream
+from .resilience import storage_breaker
+from .supabase_client import SupabaseClient, run_client_call
+
+logger = structlog.get_logger(__name__)
+
+PRODUCTS_BUCKET = "products"
+SNIFF_BYTES = 16
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+upload_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_UPLOADS)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass
+class StoredImage:
+    path: str
+    url: str
+    content_type: str
+
+
+def sniff_image_type(head: bytes) -> tuple[str, str] | None:
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", "jpg"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif", "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif", "avif"
+    return None
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the {settings.MAX_UPLOAD_BYTES} byte limit",
+    )
+
+
+# Rejects oversized image uploads from Content-Length before the multipart body is parsed and spooled.
+class ImageUploadRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            content_length = request.headers.get("content-length", "")
+            if content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+                raise _too_large()
+            return await handler(request)
+
+        return route_handler
+
+
+async def _iter_async(file: UploadFile, head: bytes) -> AsyncIterator[bytes]:
+    total = len(head)
+    yield head
+    while chunk := await file.read(settings.UPLOAD_CHUNK_BYTES):
+        total += len(chunk)
+        if total > settings.MAX_UPLOAD_BYTES:
+            raise UploadTooLarge()
+        yield chunk
+
+
+def _iter_sync(file: UploadFile, head: bytes) -> Iterator[bytes]:
+    total = len(head)
+    yield head
+    while chunk := file.file.read(settings.UPLOAD_CHUNK_BYTES):
+        total += len(chunk)
+        if total > settings.MAX_UPLOAD_BYTES:
+            raise UploadTooLarge()
+        yield chunk
+
+
+def build_object_path(prefix: str, extension: str) -> str:
+    return f"{prefix}/{uuid.uuid4().hex}.{extension}"
+
+
+def object_path_from_url(url: str) -> str:
+    marker = f"/object/public/{PRODUCTS_BUCKET}/"
+    if marker in url:
+        return url.split(marker, 1)[1].split("?", 1)[0]
+    return "/".join(url.split("/")[-2:])
+
+
+def upload_deadline() -> float:
+    return settings.UPSTREAM_DEADLINE_SECONDS + settings.MAX_UPLOAD_BYTES / settings.UPLOAD_MIN_BYTES_PER_SECOND
+
+
+async def upload_object(supabase: SupabaseClient, path: str, content: bytes | Iterable[bytes] | AsyncIterator[bytes], content_type: str):
+    headers = {"content-type": content_type, "cache-control": "max-age=3600", "x-upsert": "false"}
+
+    async def attempt():
+        with observe_upstream("storage", PRODUCTS_BUCKET, "upload"):
+            response = await run_client_call(
+                supabase.storage.session.post, f"/object/{PRODUCTS_BUCKET}/{path}", content=content, headers=headers
+            )
+        if response.status_code >= 500:
+            response.raise_for_status()
+        return response
+
+    try:
+        response = await storage_breaker.call(attempt, retry=False, deadline=upload_deadline())
+    except (httpx.HTTPError, StorageException) as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    if response.is_error:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=response.text)
+
+
+async def public_url(supabase: SupabaseClient, path: str) -> str:
+    return await run_client_call(supabase.storage.from_(PRODUCTS_BUCKET).get_public_url, path)
+
+
+async def remove_objects(supabase: SupabaseClient, paths: list[str]) -> None:
+    async def attempt():
+        with observe_upstream("storage", PRODUCTS_BUCKET, "remove"):
+            await run_client_call(supabase.storage.from_(PRODUCTS_BUCKET).remove, paths)
+
+    await storage_breaker.call(attempt)
+
+
+def image_object_paths(image: dict) -> list[str]:
+    paths = [object_path_from_url(image["image_url"])]
+    paths += [object_path_from_url(derivative["url"]) for derivative in image.get("derivatives") or []]
+    return paths
+
+
+async def discard_objects(supabase: SupabaseClient, paths: list[str]) -> None:
+    try:
+        await remove_objects(supabase, paths)
+    except Exception as exc:
+        logger.warning("storage_remove_failed", paths=paths, error=str(exc))
+
+
+async def remove_image_objects(supabase: SupabaseClient, image: dict) -> None:
+    await discard_objects(supabase, image_object_paths(image))
+
+
+async def store_image(supabase: SupabaseClient, file: UploadFile, prefix: str) -> StoredImage:
+    if file.size is not None and file.size > settings.MAX_UPLOAD_BYTES:
+        raise _too_large()
+
+    head = await file.read(SNIFF_BYTES)
+    sniffed = sniff_image_type(head)
+    if sniffed is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Unsupported image type",
+        )
+    content_type, extension = sniffed
+    file_path = build_object_path(prefix, extension)
+
+    is_async = isinstance(supabase.storage.session, httpx.AsyncClient)
+    content = _iter_async(file, head) if is_async else _iter_sync(file, head)
+
+    async with upload_slots:
+        try:
+            await upload_object(supabase, file_path, content, content_type)
+        except UploadTooLarge:
+            raise _too_large()
+
+    return StoredImage(path=file_path, url=await public_url(supabase, file_path), content_type=content_type)
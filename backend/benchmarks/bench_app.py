@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.env import set_defaults
+
+set_defaults()
+
+import httpx
+from PIL import Image
+
+import main
+from app import services, supabase_client
+from app.cache import catalog_cache, response_cache
+from app.config import settings
+from app.search import search_index
+from benchmarks.fake_supabase import FakeSupabase, seed_catalog
+
+SEARCH_TERMS = ["classic", "leather", "wire", "عطر", "عو", "قهوه", "premium cotton", "مسك جلد"]
+
+
+@dataclass
+class Result:
+    scenario: str
+    catalog_size: int
+    concurrency: int
+    requests: int
+    errors: int
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    @property
+    def key(self) -> tuple:
+        return self.scenario, self.catalog_size, self.concurrency
+
+
+class Scenario:
+    name = ""
+    admin = False
+
+    def __init__(self, catalog_size: int, rng: random.Random):
+        self.catalog_size = catalog_size
+        self.rng = rng
+
+    def product_id(self) -> int:
+        return self.rng.randint(1, self.catalog_size)
+
+    async def request(self, client: httpx.AsyncClient) -> httpx.Response:
+        raise NotImplementedError
+
+    def failed(self, response: httpx.Response) -> bool:
+        return response.status_code >= 400
+
+
+class ProductList(Scenario):
+    name = "products_list"
+
+    async def request(self, client):
+        return await client.get("/api/products", params={"limit": 20, "cursor": self.cursor()})
+
+    def cursor(self) -> str | None:
+        after = self.rng.randint(0, max(self.catalog_size - 20, 0))
+        return services.encode_cursor(after) if after else None
+
+
+class ProductDetail(Scenario):
+    name = "product_detail"
+
+    async def request(self, client):
+        return await client.get(f"/api/products/{self.product_id()}")
+
+
+class Categories(Scenario):
+    name = "categories"
+
+    async def request(self, client):
+        return await client.get("/api/categories")
+
+
+class Search(Scenario):
+    name = "search"
+
+    async def request(self, client):
+        return await client.get("/api/search", params={"q": self.rng.choice(SEARCH_TERMS), "limit": 20})
+
+
+class AdminUpdate(Scenario):
+    name = "admin_update"
+    admin = True
+
+    async def request(self, client):
+        return await client.patch(f"/api/admin/products/{self.product_id()}", json={"stock_quantity": self.rng.randint(0, 50)})
+
+
+def make_png(width: int = 1600, height: int = 1200) -> bytes:
+    buffer = BytesIO()
+    Image.linear_gradient("L").resize((width, height)).convert("RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class ImageUpload(Scenario):
+    name = "image_upload"
+    admin = True
+    image = b""
+
+    async def request(self, client):
+        if not ImageUpload.image:
+            ImageUpload.image = make_png()
+        files = {"file": ("image.png", self.image, "image/png")}
+        return await client.post(f"/api/admin/products/{self.product_id()}/images", files=files)
+
+
+class Checkout(Scenario):
+    name = "checkout"
+    hot_products = 5
+
+    async def request(self, client):
+        product_id = self.rng.randint(1, min(self.hot_products, self.catalog_size))
+        headers = {"CF-Connecting-IP": f"198.51.100.{self.rng.randint(1, 254)}"}
+        response = await client.post("/api/checkout/cart", headers=headers)
+        if response.status_code != 201:
+            return response
+        headers["X-Cart-Token"] = response.json()["cart_token"]
+        response = await client.post("/api/checkout/reservations", json={"items": [{"product_id": product_id, "quantity": 1}]}, headers=headers)
+        if response.status_code != 201:
+            return response
+        return await client.delete(f"/api/checkout/reservations/{response.json()['id']}", headers=headers)
+
+    def failed(self, response):
+        return response.status_code >= 400 and response.status_code != 409
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (ProductList, ProductDetail, Categories, Search, AdminUpdate, ImageUpload, Checkout)}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, concurrency: int, total: int, warmup: int) -> Result:
+    for _ in range(warmup):
+        await scenario.request(client)
+
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await scenario.request(client)
+                failed = scenario.failed(response)
+            except Exception:
+                failed = True
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return Result(
+        scenario=scenario.name,
+        catalog_size=scenario.catalog_size,
+        concurrency=concurrency,
+        requests=len(latencies),
+        errors=errors,
+        throughput_rps=round(len(latencies) / elapsed, 1),
+        p50_ms=round(statistics.median(latencies), 3),
+        p95_ms=round(percentile(latencies, 0.95), 3),
+        p99_ms=round(percentile(latencies, 0.99), 3),
+    )
+
+
+async def run_catalog(args, catalog_size: int) -> list[Result]:
+    backend = FakeSupabase(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, seed=args.seed)
+    seed_catalog(backend, catalog_size, seed=args.seed)
+    supabase_client.use_transports(backend.transport(), backend.async_transport())
+    catalog_cache.clear()
+    response_cache.clear()
+
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        while settings.SEARCH_ENABLED and not search_index.ready:
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            login = await client.post("/api/login", json={"password": settings.AZHAR_ADMIN_INITIAL_PASSWORD})
+            admin_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            for name in args.scenarios:
+                for concurrency in args.concurrency:
+                    scenario = SCENARIOS[name](catalog_size, random.Random(args.seed))
+                    client.headers.clear()
+                    if scenario.admin:
+                        client.headers.update(admin_headers)
+                    if not args.warm_cache:
+                        catalog_cache.clear()
+                        response_cache.clear()
+                    result = await run_scenario(client, scenario, concurrency, args.requests, args.warmup)
+                    print(format_result(result), flush=True)
+                    results.append(result)
+    supabase_client.use_transports()
+    return results
+
+
+async def run_all(args) -> list[Result]:
+    results = []
+    for catalog_size in args.catalog_sizes:
+        results += await run_catalog(args, catalog_size)
+    return results
+
+
+def format_result(result: Result) -> str:
+    return (
+        f"{result.scenario:>16} {result.catalog_size:>8} {result.concurrency:>5} {result.requests:>7} {result.errors:>6}"
+        f" {result.throughput_rps:>10.1f} {result.p50_ms:>9.2f} {result.p95_ms:>9.2f} {result.p99_ms:>9.2f}"
+    )
+
+
+def compare(results: list[Result], baseline_path: str, max_regression: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = {tuple(item[k] for k in ("scenario", "catalog_size", "concurrency")): item for item in json.load(f)["results"]}
+    regressed = False
+    print(f"\n{'scenario':>16} {'size':>8} {'conc':>5} {'rps Δ%':>9} {'p95 Δ%':>9}")
+    for result in results:
+        previous = baseline.get(result.key)
+        if previous is None:
+            continue
+        rps_delta = (result.throughput_rps / previous["throughput_rps"] - 1) * 100 if previous["throughput_rps"] else 0.0
+        p95_delta = (result.p95_ms / previous["p95_ms"] - 1) * 100 if previous["p95_ms"] else 0.0
+        flag = rps_delta < -max_regression or p95_delta > max_regression
+        regressed |= flag
+        print(f"{result.scenario:>16} {result.catalog_size:>8} {result.concurrency:>5} {rps_delta:>+9.1f} {p95_delta:>+9.1f}{'  REGRESSION' if flag else ''}")
+    return regressed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the FastAPI app against an in-process fake Supabase.")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=["products_list", "product_detail", "categories", "search", "admin_update"])
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Injected upstream latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=0.5)
+    parser.add_argument("--warm-cache", action="store_true", help="Keep catalog caches between scenarios")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="Write results as JSON (use as a baseline later)")
+    parser.add_argument("--baseline", help="Compare against a previously saved JSON file")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="Percent change that counts as a regression")
+    args = parser.parse_args()
+
+    print(f"{'scenario':>16} {'size':>8} {'conc':>5} {'reqs':>7} {'errors':>6} {'rps':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    results = asyncio.run(run_all(args))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "client_mode": settings.SUPABASE_CLIENT_MODE,
+                    "json_mode": settings.JSON_RESPONSE_MODE,
+                    "args": {k: v for k, v in vars(args).items() if k not in ("save", "baseline")},
+                },
+                "results": [asdict(result) for result in results],
+            }, f, indent=2)
+    if args.baseline and compare(results, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
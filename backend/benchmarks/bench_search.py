@@ -0,0 +1,98 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.env import set_defaults
+
+set_defaults()
+
+from app.search import SearchIndex
+
+LATIN_WORDS = [
+    "laptop", "phone", "case", "charger", "cable", "wireless", "bluetooth", "speaker", "headphones", "watch",
+    "leather", "cotton", "shirt", "dress", "shoes", "bag", "wallet", "perfume", "cream", "serum",
+    "coffee", "tea", "honey", "dates", "chocolate", "lamp", "chair", "table", "pillow", "blanket",
+]
+ARABIC_WORDS = [
+    "عطر", "أزهار", "ورد", "عود", "مسك", "قهوة", "تمر", "عسل", "شاي", "حقيبة",
+    "ساعة", "هاتف", "غطاء", "شاحن", "كرسي", "طاولة", "وسادة", "بطانية", "قميص", "فستان",
+    "حذاء", "محفظة", "كريم", "زيت", "صابون", "إضاءة", "مصباح", "سماعة", "لاسلكي", "جلد",
+]
+QUERIES = [
+    "l", "la", "lap", "laptop", "wireless cha", "leather bag", "perfume 12",
+    "ع", "عط", "عطر", "عطر ازهار", "قهوه", "اضاءه", "ساعه جلد", "missing term",
+]
+
+
+def make_catalog(size: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    categories = [{"id": i, "name": f"{rng.choice(LATIN_WORDS)} {rng.choice(ARABIC_WORDS)}"} for i in range(40)]
+    products = []
+    for i in range(1, size + 1):
+        words = LATIN_WORDS if i % 2 else ARABIC_WORDS
+        category = rng.choice(categories)
+        products.append({
+            "id": i,
+            "name": " ".join(rng.sample(words, 3)) + f" {i % 500}",
+            "description": " ".join(rng.choices(words + LATIN_WORDS, k=12)),
+            "category_id": category["id"],
+            "category": {"name": category["name"]},
+            "product_variants": [{"name": f"{rng.choice(words)} {size_name}"} for size_name in ("S", "M", "L")[: i % 4]],
+        })
+    return products
+
+
+def percentile(timings: list[float], fraction: float) -> float:
+    return sorted(timings)[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure search index build, query and update latency.")
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--p95-ms", type=float, default=20.0, help="Fail when any query's p95 exceeds this")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.products)
+    index = SearchIndex()
+    start = time.perf_counter()
+    for offset in range(0, len(catalog), args.batch_size):
+        index.add_many(catalog[offset:offset + args.batch_size])
+    build = time.perf_counter() - start
+    print(f"built {index.stats()} in {build:.2f}s")
+
+    failed = False
+    print(f"{'query':>16} {'hits':>7} {'p50 (ms)':>10} {'p95 (ms)':>10} {'max (ms)':>10}")
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            total, _ = index.search(query, args.limit)
+            timings.append((time.perf_counter() - start) * 1000)
+        p95 = percentile(timings, 0.95)
+        failed |= p95 > args.p95_ms
+        print(f"{query:>16} {total:>7} {statistics.median(timings):>10.2f} {p95:>10.2f} {max(timings):>10.2f}")
+
+    rng = random.Random(11)
+    timings = []
+    for _ in range(args.repeat):
+        product = dict(rng.choice(catalog), name=f"{rng.choice(LATIN_WORDS)} {rng.choice(ARABIC_WORDS)} {rng.random()}")
+        start = time.perf_counter()
+        index.add_many([product])
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"single product update: p50 {statistics.median(timings):.3f} ms, p95 {percentile(timings, 0.95):.3f} ms")
+
+    if failed:
+        print(f"p95 target of {args.p95_ms} ms exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
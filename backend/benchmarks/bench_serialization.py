@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.env import set_defaults
+
+set_defaults()
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app import schemas
+from app.config import settings
+from app.responses import mark_validated, serialize
+
+
+def make_catalog(size: int) -> list[dict]:
+    return [
+        {
+            "id": i,
+            "name": f"Product {i}",
+            "description": "A fairly ordinary product description used for benchmarking.",
+            "price": 10.0 + i % 100,
+            "stock_quantity": i % 25,
+            "category_id": i % 12,
+            "category": {"id": i % 12, "name": f"Category {i % 12}"},
+            "product_images": [
+                {
+                    "id": i * 3 + j,
+                    "product_id": i,
+                    "image_url": f"https://example.supabase.co/storage/v1/object/public/products/{i}/{j}.webp",
+                    "is_primary": j == 0,
+                    "created_at": "2024-05-01T12:00:00+00:00",
+                }
+                for j in range(3)
+            ],
+            "product_variants": [
+                {"id": i * 2 + j, "product_id": i, "name": f"Size {j}", "stock_quantity": j * 4, "image_url": None}
+                for j in range(2)
+            ],
+        }
+        for i in range(size)
+    ]
+
+
+def fastapi_route_path(field, data: list[dict]) -> bytes:
+    content = asyncio.run(serialize_response(field=field, response_content=data))
+    return JSONResponse(content=content).body
+
+
+def app_path(mode: str, data: list[dict]) -> bytes:
+    previous = settings.JSON_RESPONSE_MODE
+    settings.JSON_RESPONSE_MODE = mode
+    try:
+        return serialize(data, List[schemas.Product])
+    finally:
+        settings.JSON_RESPONSE_MODE = previous
+
+
+def cache_fill(mode: str, data: list[dict]) -> list[dict]:
+    previous = settings.JSON_RESPONSE_MODE
+    settings.JSON_RESPONSE_MODE = mode
+    try:
+        return mark_validated(data, schemas.Product)
+    finally:
+        settings.JSON_RESPONSE_MODE = previous
+
+
+def measure(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare catalog JSON serialization paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    field = create_model_field(name="Response_list_products", type_=List[schemas.Product], mode="serialization")
+
+    modes = ("standard", "fast", "trusted")
+    print(f"{'products':>10} {'fastapi (ms)':>14}" + "".join(f" {mode + ' (ms)':>15} {'speedup':>8}" for mode in modes))
+    for size in args.sizes:
+        data = make_catalog(size)
+        baseline = measure(lambda: fastapi_route_path(field, data), args.repeat)
+        row = f"{size:>10} {baseline * 1000:>14.2f}"
+        for mode in modes:
+            cached = cache_fill(mode, data)
+            elapsed = measure(lambda: app_path(mode, cached), args.repeat)
+            row += f" {elapsed * 1000:>15.2f} {baseline / elapsed:>7.1f}x"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
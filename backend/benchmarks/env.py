@@ -0,0 +1,16 @@
+import os
+
+DEFAULTS = {
+    "SUPABASE_URL": "http://fake.supabase.local",
+    "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark",
+    "AZHAR_ADMIN_EMAIL": "admin@example.com",
+    "AZHAR_ADMIN_INITIAL_PASSWORD": "benchmark-password",
+    "SECRET_KEY": "benchmark-secret",
+    "LOG_LEVEL": "WARNING",
+    "CLIENT_ADDRESS_HEADER": "CF-Connecting-IP",
+}
+
+
+def set_defaults() -> None:
+    for name, value in DEFAULTS.items():
+        os.environ.setdefault(name, value)
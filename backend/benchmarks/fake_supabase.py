@@ -0,0 +1,517 @@
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote
+
+import httpx
+
+TABLE_DEFAULTS = {
+    "categories": {},
+    "products": {"description": None, "stock_quantity": 0, "category_id": None},
+    "product_images": {"is_primary": False, "derivatives": []},
+    "product_variants": {"image_url": None, "image_derivatives": []},
+    "auth_state": {"token_generation": 0},
+}
+
+# (parent table, embedded table) -> (cardinality, parent column, embedded column)
+RELATIONS = {
+    ("products", "categories"): ("one", "category_id", "id"),
+    ("products", "product_images"): ("many", "id", "product_id"),
+    ("products", "product_variants"): ("many", "id", "product_id"),
+    ("product_images", "products"): ("one", "product_id", "id"),
+    ("product_variants", "products"): ("one", "product_id", "id"),
+}
+
+CASCADES = {
+    "products": [("product_images", "product_id", "delete"), ("product_variants", "product_id", "delete")],
+    "categories": [("products", "category_id", "set_null")],
+}
+
+OPERATORS = {
+    "eq": lambda value, arg: value == arg,
+    "neq": lambda value, arg: value != arg,
+    "gt": lambda value, arg: value is not None and value > arg,
+    "gte": lambda value, arg: value is not None and value >= arg,
+    "lt": lambda value, arg: value is not None and value < arg,
+    "lte": lambda value, arg: value is not None and value <= arg,
+    "in": lambda value, arg: value in arg,
+    "is": lambda value, arg: value is arg,
+}
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+class PostgrestError(Exception):
+    def __init__(self, status_code: int, message: str, code: str = "PGRST000"):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+
+def split_top_level(text: str) -> list[str]:
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current.append(ch)
+    if current:
+        parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def parse_select(text: str) -> list[tuple[str, str, list | None]]:
+    columns = []
+    for part in split_top_level(text or "*"):
+        match = re.fullmatch(r"(?:(\w+):)?(\w+|\*)(?:!\w+)?(?:\((.*)\))?", part, re.S)
+        if match is None:
+            raise PostgrestError(400, f"Unsupported select item: {part}", "PGRST100")
+        alias, name, inner = match.groups()
+        columns.append((alias or name, name, parse_select(inner) if inner is not None else None))
+    return columns
+
+
+def coerce(raw: str, sample):
+    # postgrest-py renders Python values with str(), so booleans arrive as "True"/"False".
+    lowered = raw.lower()
+    if lowered == "null" or raw == "None":
+        return None
+    if isinstance(sample, bool) or lowered in ("true", "false"):
+        return lowered == "true"
+    if isinstance(sample, int):
+        return int(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+class FakeSupabase:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.tables: dict[str, dict[int, dict]] = {name: {} for name in TABLE_DEFAULTS}
+        self.next_ids: dict[str, int] = {name: 1 for name in TABLE_DEFAULTS}
+        self.objects: dict[str, tuple[bytes, str]] = {}
+        self.requests = 0
+        self._groups: dict = {}
+        self.rpcs = {
+            "create_product_image": self._rpc_create_product_image,
+            "delete_product_image": self._rpc_delete_product_image,
+            "set_primary_product_image": self._rpc_set_primary_product_image,
+            "bump_token_generation": self._rpc_bump_token_generation,
+            "reserve_stock_batch": self._rpc_reserve_stock_batch,
+            "commit_stock_reservation": self._rpc_commit_stock_reservation,
+            "release_stock_reservation": self._rpc_release_stock_reservation,
+            "expire_stock_reservations": self._rpc_expire_stock_reservations,
+        }
+        self.reservations: dict[str, dict] = {}
+        self.insert("auth_state", [{"id": 1, "token_generation": 0}])
+
+    def delay(self) -> float:
+        if not self.latency and not self.jitter:
+            return 0.0
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    # Data access
+
+    def insert(self, table: str, rows: list[dict], upsert: bool = False) -> list[dict]:
+        self._groups.clear()
+        store = self.tables[table]
+        written = []
+        for row in rows:
+            if upsert and row.get("id") in store:
+                store[row["id"]].update(row)
+                written.append(store[row["id"]])
+                continue
+            record = {**TABLE_DEFAULTS[table], **row}
+            if record.get("id") is None:
+                record["id"] = self.next_ids[table]
+            self.next_ids[table] = max(self.next_ids[table], record["id"] + 1)
+            if table == "product_images":
+                record.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+            store[record["id"]] = record
+            written.append(record)
+        return [dict(row) for row in written]
+
+    def delete_rows(self, table: str, rows: list[dict]) -> None:
+        self._groups.clear()
+        for row in rows:
+            self.tables[table].pop(row["id"], None)
+            for child, column, action in CASCADES.get(table, []):
+                children = [child_row for child_row in self.tables[child].values() if child_row[column] == row["id"]]
+                if action == "delete":
+                    self.delete_rows(child, children)
+                else:
+                    for child_row in children:
+                        child_row[column] = None
+
+    def _related(self, table: str, column: str, value) -> list[dict]:
+        if column == "id":
+            row = self.tables[table].get(value)
+            return [row] if row is not None else []
+        grouped = self._groups.get((table, column))
+        if grouped is None:
+            grouped = self._groups[(table, column)] = {}
+            for row in self.tables[table].values():
+                grouped.setdefault(row[column], []).append(row)
+        return grouped.get(value, [])
+
+    def _embed(self, table: str, row: dict, columns: list) -> dict:
+        result = {}
+        for alias, name, inner in columns:
+            if name == "*":
+                result.update(row)
+            elif inner is None:
+                result[alias] = row.get(name)
+            else:
+                cardinality, parent_column, child_column = RELATIONS[(table, name)]
+                related = [
+                    self._embed(name, child, inner)
+                    for child in self._related(name, child_column, row[parent_column])
+                ]
+                result[alias] = related if cardinality == "many" else (related[0] if related else None)
+        return result
+
+    def _filters(self, table: str, params: list[tuple[str, str]]) -> tuple[list, dict[str, list]]:
+        sample = next(iter(self.tables[table].values()), {})
+        filters, embedded = [], {}
+        for key, raw in params:
+            if key in RESERVED_PARAMS:
+                continue
+            operator, _, argument = raw.partition(".")
+            if operator not in OPERATORS:
+                raise PostgrestError(400, f"Unsupported operator: {operator}", "PGRST100")
+            target, _, column = key.rpartition(".")
+            column_sample = sample.get(column)
+            if target:
+                children = next(iter(self.tables.get(target, {}).values()), {})
+                column_sample = children.get(column)
+            if operator == "in":
+                value = frozenset(coerce(item.strip('"'), column_sample) for item in argument.strip("()").split(",") if item)
+            elif operator == "is":
+                value = {"null": None, "none": None, "true": True, "false": False}[argument.lower()]
+            else:
+                value = coerce(unquote(argument), column_sample)
+            condition = (column, OPERATORS[operator], value)
+            if target:
+                embedded.setdefault(target, []).append(condition)
+            else:
+                filters.append(condition)
+        return filters, embedded
+
+    def _matching(self, table: str, filters: list) -> list[dict]:
+        rows = self.tables[table].values()
+        for column, test, value in filters:
+            if column == "id" and test is OPERATORS["eq"]:
+                rows = [self.tables[table][value]] if value in self.tables[table] else []
+                break
+        return [row for row in rows if all(test(row.get(column), value) for column, test, value in filters)]
+
+    def select(self, table: str, params: list[tuple[str, str]]) -> list[dict]:
+        query = dict(params)
+        filters, embedded = self._filters(table, params)
+        rows = self._matching(table, filters)
+        for clause in reversed(split_top_level(query.get("order", ""))):
+            column, _, direction = clause.partition(".")
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+        offset = int(query.get("offset", 0))
+        if "limit" in query:
+            rows = rows[offset:offset + int(query["limit"])]
+        elif offset:
+            rows = rows[offset:]
+        columns = parse_select(query.get("select", "*"))
+        result = [self._embed(table, row, columns) for row in rows]
+        for target, conditions in embedded.items():
+            alias = next((alias for alias, name, inner in columns if name == target), target)
+            for row in result:
+                if isinstance(row.get(alias), list):
+                    row[alias] = [child for child in row[alias] if all(test(child.get(c), v) for c, test, v in conditions)]
+        return result
+
+    # RPC functions mirroring supabase/migrations
+
+    def _rpc_create_product_image(self, args: dict) -> list[dict]:
+        has_primary = any(
+            image["is_primary"] for image in self.tables["product_images"].values() if image["product_id"] == args["p_product_id"]
+        )
+        return self.insert("product_images", [{
+            "product_id": args["p_product_id"],
+            "image_url": args["p_image_url"],
+            "is_primary": not has_primary,
+            "derivatives": args.get("p_derivatives") or [],
+        }])
+
+    def _rpc_delete_product_image(self, args: dict) -> list[dict]:
+        image = self.tables["product_images"].pop(args["p_image_id"], None)
+        if image is None:
+            return []
+        if image["is_primary"]:
+            remaining = sorted(
+                (other for other in self.tables["product_images"].values() if other["product_id"] == image["product_id"]),
+                key=lambda other: (other["created_at"], other["id"]),
+            )
+            if remaining:
+                remaining[0]["is_primary"] = True
+        return [dict(image)]
+
+    def _rpc_set_primary_product_image(self, args: dict) -> list[dict]:
+        image = self.tables["product_images"].get(args["p_image_id"])
+        if image is None:
+            return []
+        for other in self.tables["product_images"].values():
+            if other["product_id"] == image["product_id"]:
+                other["is_primary"] = other["id"] == image["id"]
+        return [dict(image)]
+
+    def _rpc_bump_token_generation(self, args: dict) -> int:
+        state = self.tables["auth_state"][1]
+        state["token_generation"] += 1
+        return state["token_generation"]
+
+    @staticmethod
+    def _reservation_lines(items: list[dict]) -> dict[tuple, int]:
+        lines: dict[tuple, int] = {}
+        for item in items:
+            variant_id = item.get("variant_id")
+            key = (int(item["product_id"]), None if variant_id is None else int(variant_id))
+            lines[key] = lines.get(key, 0) + int(item["quantity"])
+        return lines
+
+    def _stock_row(self, product_id: int, variant_id: int | None) -> dict | None:
+        if variant_id is None:
+            return self.tables["products"].get(product_id)
+        variant = self.tables["product_variants"].get(variant_id)
+        return variant if variant is not None and variant["product_id"] == product_id else None
+
+    def _stock_levels(self, keys) -> dict:
+        products = self.tables["products"]
+        variants = self.tables["product_variants"]
+        return {
+            "products": [
+                {"id": product_id, "stock_quantity": products[product_id]["stock_quantity"]}
+                for product_id in sorted({product_id for product_id, variant_id in keys if variant_id is None})
+                if product_id in products
+            ],
+            "variants": [
+                {"id": variant_id, "product_id": variants[variant_id]["product_id"], "stock_quantity": variants[variant_id]["stock_quantity"]}
+                for variant_id in sorted({variant_id for _, variant_id in keys if variant_id is not None})
+                if variant_id in variants
+            ],
+        }
+
+    def _restore_reserved_stock(self, reservations: list[dict]) -> dict:
+        keys = set()
+        for reservation in reservations:
+            for key, quantity in reservation["lines"].items():
+                row = self._stock_row(*key)
+                if row is not None:
+                    row["stock_quantity"] = (row["stock_quantity"] or 0) + quantity
+                keys.add(key)
+        return self._stock_levels(keys)
+
+    def _rpc_reserve_stock_batch(self, args: dict) -> dict:
+        results = []
+        touched = set()
+        for request in args["p_requests"]:
+            try:
+                lines = self._reservation_lines(request["items"])
+                ttl_seconds = int(request["ttl_seconds"])
+                cart_id, client_key, max_active = request["cart_id"], request["client_key"], int(request["max_active"])
+            except (KeyError, TypeError, ValueError) as exc:
+                results.append({"reserved": False, "error": str(exc)})
+                continue
+            now = datetime.now(timezone.utc)
+            active = sum(
+                1 for reservation in self.reservations.values()
+                if reservation["client_key"] == client_key and reservation["status"] == "active" and reservation["expires_at"] > now
+            )
+            if active >= max_active:
+                results.append({"reserved": False, "limited": True})
+                continue
+            shortages = []
+            for (product_id, variant_id), quantity in lines.items():
+                available = (self._stock_row(product_id, variant_id) or {}).get("stock_quantity") or 0
+                if available < quantity:
+                    shortages.append({"product_id": product_id, "variant_id": variant_id, "requested": quantity, "available": available})
+            if shortages:
+                results.append({"reserved": False, "shortages": shortages})
+                continue
+            for key, quantity in lines.items():
+                self._stock_row(*key)["stock_quantity"] -= quantity
+            reservation_id = str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+            expires_at = now + timedelta(seconds=ttl_seconds)
+            self.reservations[reservation_id] = {"cart_id": cart_id, "client_key": client_key, "status": "active", "expires_at": expires_at, "lines": lines}
+            touched |= lines.keys()
+            results.append({"reserved": True, "id": reservation_id, "expires_at": expires_at.isoformat()})
+        return {"results": results, "stock": self._stock_levels(touched)}
+
+    def _rpc_commit_stock_reservation(self, args: dict) -> bool:
+        reservation = self.reservations.get(args["p_reservation_id"])
+        if reservation is None or reservation["cart_id"] != args["p_cart_id"] or reservation["status"] != "active" or reservation["expires_at"] <= datetime.now(timezone.utc):
+            return False
+        reservation["status"] = "committed"
+        return True
+
+    def _rpc_release_stock_reservation(self, args: dict) -> dict | None:
+        reservation = self.reservations.get(args["p_reservation_id"])
+        if reservation is None or reservation["cart_id"] != args["p_cart_id"] or reservation["status"] != "active":
+            return None
+        reservation["status"] = "released"
+        return {"stock": self._restore_reserved_stock([reservation])}
+
+    def _rpc_expire_stock_reservations(self, args: dict) -> dict:
+        now = datetime.now(timezone.utc)
+        expired = [
+            reservation for reservation in self.reservations.values()
+            if reservation["status"] == "active" and reservation["expires_at"] <= now
+        ][:args.get("p_limit", 1000)]
+        for reservation in expired:
+            reservation["status"] = "expired"
+        return {"expired": len(expired), "stock": self._restore_reserved_stock(expired)}
+
+    # HTTP
+
+    def _postgrest(self, request: httpx.Request, body: bytes, resource: str) -> httpx.Response:
+        params = list(request.url.params.multi_items())
+        if resource.startswith("rpc/"):
+            function = self.rpcs.get(resource[4:])
+            if function is None:
+                raise PostgrestError(404, f"Could not find the function {resource[4:]}", "PGRST202")
+            return httpx.Response(200, json=function(json.loads(body or b"{}")))
+
+        table = resource
+        if table not in self.tables:
+            raise PostgrestError(404, f"relation \"public.{table}\" does not exist", "42P01")
+        method = request.method
+        if method in ("GET", "HEAD"):
+            return httpx.Response(200, json=self.select(table, params))
+        if method == "POST":
+            payload = json.loads(body)
+            rows = payload if isinstance(payload, list) else [payload]
+            upsert = "merge-duplicates" in request.headers.get("prefer", "")
+            return httpx.Response(201, json=self.insert(table, rows, upsert=upsert))
+
+        filters, _ = self._filters(table, params)
+        rows = self._matching(table, filters)
+        if method == "PATCH":
+            changes = json.loads(body)
+            for row in rows:
+                row.update(changes)
+            return httpx.Response(200, json=[dict(row) for row in rows])
+        if method == "DELETE":
+            deleted = [dict(row) for row in rows]
+            self.delete_rows(table, rows)
+            return httpx.Response(200, json=deleted)
+        raise PostgrestError(405, f"Unsupported method {method}")
+
+    def _storage(self, request: httpx.Request, body: bytes, resource: str) -> httpx.Response:
+        if request.method == "POST" and resource.startswith("object/"):
+            path = resource[len("object/"):]
+            self.objects[path] = (body, request.headers.get("content-type", "application/octet-stream"))
+            return httpx.Response(200, json={"Key": path})
+        if request.method == "GET" and resource.startswith("object/"):
+            path = resource[len("object/"):].removeprefix("public/").removeprefix("authenticated/")
+            if path not in self.objects:
+                return httpx.Response(404, json={"statusCode": "404", "error": "not_found", "message": "Object not found"})
+            content, content_type = self.objects[path]
+            return httpx.Response(200, content=content, headers={"content-type": content_type})
+        if request.method == "DELETE" and resource.startswith("object/"):
+            bucket = resource[len("object/"):]
+            removed = []
+            for prefix in json.loads(body).get("prefixes", []):
+                if self.objects.pop(f"{bucket}/{prefix}", None) is not None:
+                    removed.append({"name": prefix})
+            return httpx.Response(200, json=removed)
+        return httpx.Response(404, json={"statusCode": "404", "error": "not_found", "message": "Unsupported storage call"})
+
+    def handle(self, request: httpx.Request, body: bytes) -> httpx.Response:
+        self.requests += 1
+        if request.method != "GET":
+            self._groups.clear()
+        path = request.url.path
+        try:
+            if path.startswith("/rest/v1/"):
+                return self._postgrest(request, body, path[len("/rest/v1/"):])
+            if path.startswith("/storage/v1/"):
+                return self._storage(request, body, path[len("/storage/v1/"):])
+            return httpx.Response(404, json={"message": f"Unknown path {path}"})
+        except PostgrestError as exc:
+            return httpx.Response(exc.status_code, json={"message": str(exc), "code": exc.code, "details": None, "hint": None})
+
+    def transport(self) -> "FakeTransport":
+        return FakeTransport(self)
+
+    def async_transport(self) -> "FakeAsyncTransport":
+        return FakeAsyncTransport(self)
+
+
+class FakeTransport(httpx.BaseTransport):
+    def __init__(self, backend: FakeSupabase):
+        self.backend = backend
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        delay = self.backend.delay()
+        if delay:
+            time.sleep(delay)
+        return self.backend.handle(request, body)
+
+
+class FakeAsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, backend: FakeSupabase):
+        self.backend = backend
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        delay = self.backend.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self.backend.handle(request, body)
+
+
+def seed_catalog(
+    backend: FakeSupabase,
+    products: int,
+    categories: int = 20,
+    images_per_product: int = 3,
+    variants_per_product: int = 2,
+    seed: int = 0,
+) -> None:
+    rng = random.Random(seed)
+    words = ["classic", "premium", "leather", "cotton", "wireless", "compact", "عطر", "عود", "قهوة", "ورد", "مسك", "جلد"]
+    backend.insert("categories", [{"id": i, "name": f"{rng.choice(words)} {i}"} for i in range(1, categories + 1)])
+    backend.insert("products", [
+        {
+            "id": i,
+            "name": f"{rng.choice(words)} {rng.choice(words)} {i}",
+            "description": " ".join(rng.choices(words, k=10)),
+            "price": round(rng.uniform(1, 500), 2),
+            "stock_quantity": rng.randint(0, 50),
+            "category_id": rng.randint(1, categories),
+        }
+        for i in range(1, products + 1)
+    ])
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc).isoformat()
+    backend.insert("product_images", [
+        {
+            "product_id": i,
+            "image_url": f"https://fake.supabase.local/storage/v1/object/public/products/{i}/{j}.webp",
+            "is_primary": j == 0,
+            "created_at": created_at,
+        }
+        for i in range(1, products + 1)
+        for j in range(images_per_product)
+    ])
+    backend.insert("product_variants", [
+        {"product_id": i, "name": f"Size {j}", "stock_quantity": rng.randint(0, 20)}
+        for i in range(1, products + 1)
+        for j in range(variants_per_product)
+    ])
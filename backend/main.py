@@ -1,15 +1,50 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import router as api_router, admin_router
+from app.api import router as api_router, admin_router, upload_router
 from app.config import settings
+from app.services import require_metrics_access
 from app.logging_config import setup_logging
-from app.errors import global_exception_handler
+from app.errors import global_exception_handler, upstream_exception_handler
+from app.supabase_client import init_clients, close_clients, get_pool_stats
+from app.cache import catalog_cache, search_cache
+from app.singleflight import catalog_flights
+from app.images import start_image_pool, shutdown_image_pool
+from app.search import search_index, search_indexer
+from app.tokens import token_cache
+from app.metrics import MetricsMiddleware, render_metrics, mark_worker_stopped
+from app.events import catalog_events
+from app.realtime import realtime_listener
+from app.resilience import UpstreamError, upstream_breakers
+from app.reservations import reservation_batcher, reservation_sweeper
 
 setup_logging()
 
-app = FastAPI(title="AzharStore API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_clients()
+    start_image_pool()
+    if settings.SEARCH_ENABLED:
+        search_indexer.start()
+    if settings.CATALOG_REALTIME_ENABLED:
+        realtime_listener.start()
+    if settings.STOCK_RESERVATION_SWEEP_SECONDS > 0:
+        reservation_sweeper.start()
+    yield
+    await reservation_sweeper.stop()
+    await realtime_listener.stop()
+    await search_indexer.stop()
+    shutdown_image_pool()
+    await close_clients()
+    mark_worker_stopped()
+
+
+app = FastAPI(title="AzharStore API", version="0.1.0", lifespan=lifespan)
 
 app.add_exception_handler(Exception, global_exception_handler)
+app.add_exception_handler(UpstreamError, upstream_exception_handler)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,7 +52,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Last-Modified"],
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 async def root():
@@ -31,5 +68,33 @@ async def health():
 async def health_head():
     return None
 
+@app.get("/health/ready")
+async def health_ready():
+    breakers = {name: breaker.stats() for name, breaker in upstream_breakers.items()}
+    initialized = get_pool_stats()["initialized"]
+    degraded = any(stats["state"] == "open" for stats in breakers.values())
+    return JSONResponse(
+        status_code=200 if initialized else 503,
+        content={
+            "status": "starting" if not initialized else "degraded" if degraded else "ready",
+            "search_ready": search_index.ready,
+            "breakers": breakers,
+        },
+    )
+
+@app.get("/health/pool", dependencies=[Depends(require_metrics_access)])
+async def health_pool():
+    return get_pool_stats()
+
+@app.get("/health/cache", dependencies=[Depends(require_metrics_access)])
+async def health_cache():
+    return {**catalog_cache.stats(), "singleflight": catalog_flights.stats(), "search": search_index.stats(), "search_cache": search_cache.stats(), "tokens": token_cache.stats(), "events": catalog_events.stats(), "reservations": reservation_batcher.stats()}
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 app.include_router(api_router)
 app.include_router(admin_router)
+app.include_router(upload_router)
@@ -0,0 +1,5 @@
+alter table public.product_images
+    add column if not exists derivatives jsonb not null default '[]'::jsonb;
+
+alter table public.product_variants
+    add column if not exists image_derivatives jsonb not null default '[]'::jsonb;
@@ -0,0 +1,83 @@
+create or replace function public.create_product_image(
+    p_product_id bigint,
+    p_image_url text,
+    p_derivatives jsonb default '[]'::jsonb
+)
+returns setof public.product_images
+language plpgsql
+as $$
+begin
+    perform 1 from public.products where id = p_product_id for update;
+
+    return query
+    insert into public.product_images (product_id, image_url, is_primary, derivatives)
+    values (
+        p_product_id,
+        p_image_url,
+        not exists (
+            select 1 from public.product_images
+            where product_id = p_product_id and is_primary
+        ),
+        coalesce(p_derivatives, '[]'::jsonb)
+    )
+    returning *;
+end;
+$$;
+
+create or replace function public.delete_product_image(p_image_id bigint)
+returns setof public.product_images
+language plpgsql
+as $$
+declare
+    v_product_id bigint;
+    v_image public.product_images;
+begin
+    select product_id into v_product_id from public.product_images where id = p_image_id;
+    if not found then
+        return;
+    end if;
+
+    perform 1 from public.products where id = v_product_id for update;
+
+    delete from public.product_images where id = p_image_id returning * into v_image;
+    if not found then
+        return;
+    end if;
+
+    if v_image.is_primary then
+        update public.product_images
+        set is_primary = true
+        where id = (
+            select id from public.product_images
+            where product_id = v_product_id
+            order by created_at, id
+            limit 1
+        );
+    end if;
+
+    return next v_image;
+end;
+$$;
+
+create or replace function public.set_primary_product_image(p_image_id bigint)
+returns setof public.product_images
+language plpgsql
+as $$
+declare
+    v_product_id bigint;
+begin
+    select product_id into v_product_id from public.product_images where id = p_image_id;
+    if not found then
+        return;
+    end if;
+
+    perform 1 from public.products where id = v_product_id for update;
+
+    update public.product_images
+    set is_primary = (id = p_image_id)
+    where product_id = v_product_id
+      and (is_primary or id = p_image_id);
+
+    return query select * from public.product_images where id = p_image_id;
+end;
+$$;
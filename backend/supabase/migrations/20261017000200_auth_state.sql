@@ -0,0 +1,19 @@
+create table if not exists public.auth_state (
+    id smallint primary key default 1 check (id = 1),
+    token_generation integer not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+insert into public.auth_state (id) values (1) on conflict (id) do nothing;
+
+alter table public.auth_state enable row level security;
+
+create or replace function public.bump_token_generation()
+returns integer
+language sql
+as $$
+    update public.auth_state
+    set token_generation = token_generation + 1, updated_at = now()
+    where id = 1
+    returning token_generation;
+$$;
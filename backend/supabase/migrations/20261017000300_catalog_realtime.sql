@@ -0,0 +1,22 @@
+alter table public.products replica identity full;
+alter table public.product_variants replica identity full;
+alter table public.product_images replica identity full;
+alter table public.categories replica identity full;
+
+do $$
+declare
+    v_table text;
+begin
+    if not exists (select 1 from pg_publication where pubname = 'supabase_realtime') then
+        create publication supabase_realtime;
+    end if;
+    foreach v_table in array array['products', 'product_variants', 'product_images', 'categories'] loop
+        if not exists (
+            select 1 from pg_publication_tables
+            where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = v_table
+        ) then
+            execute format('alter publication supabase_realtime add table public.%I', v_table);
+        end if;
+    end loop;
+end;
+$$;
@@ -0,0 +1,305 @@
+create table if not exists public.stock_reservations (
+    id uuid primary key default gen_random_uuid(),
+    cart_id text not null,
+    client_key text not null,
+    status text not null default 'active' check (status in ('active', 'committed', 'released', 'expired')),
+    expires_at timestamptz not null,
+    created_at timestamptz not null default now(),
+    closed_at timestamptz
+);
+
+create index if not exists stock_reservations_active_expiry_idx
+    on public.stock_reservations (expires_at) where status = 'active';
+
+create index if not exists stock_reservations_client_active_idx
+    on public.stock_reservations (client_key) where status = 'active';
+
+create index if not exists stock_reservations_closed_at_idx
+    on public.stock_reservations (closed_at) where status <> 'active';
+
+create table if not exists public.stock_reservation_items (
+    reservation_id uuid not null references public.stock_reservations (id) on delete cascade,
+    product_id bigint not null references public.products (id) on delete cascade,
+    variant_id bigint references public.product_variants (id) on delete cascade,
+    quantity integer not null check (quantity > 0)
+);
+
+create index if not exists stock_reservation_items_reservation_idx
+    on public.stock_reservation_items (reservation_id);
+
+alter table public.stock_reservations enable row level security;
+alter table public.stock_reservation_items enable row level security;
+
+-- Collapse duplicate (product, variant) lines of one request.
+create or replace function public.stock_reservation_lines(p_items jsonb)
+returns table (product_id bigint, variant_id bigint, quantity bigint)
+language sql
+immutable
+as $$
+    select
+        (item->>'product_id')::bigint,
+        (item->>'variant_id')::bigint,
+        sum((item->>'quantity')::integer)
+    from jsonb_array_elements(coalesce(p_items, '[]'::jsonb)) as item
+    group by 1, 2;
+$$;
+
+-- Products then variants, each in id order, so concurrent callers cannot deadlock.
+create or replace function public.lock_stock_rows(p_product_ids bigint[], p_variant_ids bigint[])
+returns void
+language plpgsql
+as $$
+begin
+    perform 1 from public.products where id = any(p_product_ids) order by id for update;
+    perform 1 from public.product_variants where id = any(p_variant_ids) order by id for update;
+end;
+$$;
+
+create or replace function public.stock_levels(p_product_ids bigint[], p_variant_ids bigint[])
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'products', coalesce((
+            select jsonb_agg(jsonb_build_object('id', p.id, 'stock_quantity', p.stock_quantity) order by p.id)
+            from public.products p
+            where p.id = any(p_product_ids)
+        ), '[]'::jsonb),
+        'variants', coalesce((
+            select jsonb_agg(jsonb_build_object('id', v.id, 'product_id', v.product_id, 'stock_quantity', v.stock_quantity) order by v.id)
+            from public.product_variants v
+            where v.id = any(p_variant_ids)
+        ), '[]'::jsonb)
+    );
+$$;
+
+-- Reserves every request in p_requests ([{"items": [...], "ttl_seconds": n, "cart_id": c, "client_key": k, "max_active": m}, ...])
+-- under one set of row locks. A client already holding max_active live reservations, across all of its
+-- carts, gets {"limited": true}. Each request is all-or-nothing and runs in its own subtransaction, so a short
+-- or malformed request reports its own failure without affecting the others.
+create or replace function public.reserve_stock_batch(p_requests jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_request jsonb;
+    v_results jsonb := '[]'::jsonb;
+    v_shortages jsonb;
+    v_reservation public.stock_reservations;
+    v_product_ids bigint[] := '{}';
+    v_variant_ids bigint[] := '{}';
+    v_request_products bigint[];
+    v_request_variants bigint[];
+    v_touched_products bigint[] := '{}';
+    v_touched_variants bigint[] := '{}';
+begin
+    for v_request in select value from jsonb_array_elements(p_requests) loop
+        begin
+            select
+                coalesce(array_agg(line.product_id) filter (where line.variant_id is null), '{}'),
+                coalesce(array_agg(line.variant_id) filter (where line.variant_id is not null), '{}')
+            into v_request_products, v_request_variants
+            from public.stock_reservation_lines(v_request->'items') as line;
+            v_product_ids := v_product_ids || v_request_products;
+            v_variant_ids := v_variant_ids || v_request_variants;
+        exception when others then
+            null;
+        end;
+    end loop;
+
+    perform public.lock_stock_rows(v_product_ids, v_variant_ids);
+
+    for v_request in select value from jsonb_array_elements(p_requests) loop
+        begin
+            select
+                coalesce(array_agg(line.product_id) filter (where line.variant_id is null), '{}'),
+                coalesce(array_agg(line.variant_id) filter (where line.variant_id is not null), '{}')
+            into v_request_products, v_request_variants
+            from public.stock_reservation_lines(v_request->'items') as line;
+
+            if (
+                select count(*) from public.stock_reservations
+                where client_key = v_request->>'client_key' and status = 'active' and expires_at > now()
+            ) >= (v_request->>'max_active')::integer then
+                v_results := v_results || jsonb_build_array(jsonb_build_object('reserved', false, 'limited', true));
+                continue;
+            end if;
+
+            select coalesce(jsonb_agg(jsonb_build_object(
+                'product_id', line.product_id,
+                'variant_id', line.variant_id,
+                'requested', line.quantity,
+                'available', coalesce(stock.quantity, 0)
+            )), '[]'::jsonb)
+            into v_shortages
+            from public.stock_reservation_lines(v_request->'items') as line
+            left join lateral (
+                select p.stock_quantity as quantity
+                from public.products p
+                where line.variant_id is null and p.id = line.product_id
+                union all
+                select v.stock_quantity
+                from public.product_variants v
+                where line.variant_id is not null and v.id = line.variant_id and v.product_id = line.product_id
+            ) as stock on true
+            where coalesce(stock.quantity, 0) < line.quantity;
+
+            if jsonb_array_length(v_shortages) > 0 then
+                v_results := v_results || jsonb_build_array(jsonb_build_object('reserved', false, 'shortages', v_shortages));
+                continue;
+            end if;
+
+            update public.products p
+            set stock_quantity = p.stock_quantity - line.quantity
+            from public.stock_reservation_lines(v_request->'items') as line
+            where line.variant_id is null and p.id = line.product_id;
+
+            update public.product_variants v
+            set stock_quantity = v.stock_quantity - line.quantity
+            from public.stock_reservation_lines(v_request->'items') as line
+            where line.variant_id is not null and v.id = line.variant_id;
+
+            insert into public.stock_reservations (cart_id, client_key, expires_at)
+            values (v_request->>'cart_id', v_request->>'client_key', now() + make_interval(secs => (v_request->>'ttl_seconds')::integer))
+            returning * into v_reservation;
+
+            insert into public.stock_reservation_items (reservation_id, product_id, variant_id, quantity)
+            select v_reservation.id, line.product_id, line.variant_id, line.quantity
+            from public.stock_reservation_lines(v_request->'items') as line;
+        exception when others then
+            v_results := v_results || jsonb_build_array(jsonb_build_object('reserved', false, 'error', sqlerrm));
+            continue;
+        end;
+
+        v_touched_products := v_touched_products || v_request_products;
+        v_touched_variants := v_touched_variants || v_request_variants;
+        v_results := v_results || jsonb_build_array(jsonb_build_object(
+            'reserved', true,
+            'id', v_reservation.id,
+            'expires_at', v_reservation.expires_at
+        ));
+    end loop;
+
+    return jsonb_build_object(
+        'results', v_results,
+        'stock', public.stock_levels(v_touched_products, v_touched_variants)
+    );
+end;
+$$;
+
+create or replace function public.restore_reserved_stock(p_reservation_ids uuid[])
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_product_ids bigint[];
+    v_variant_ids bigint[];
+begin
+    select
+        coalesce(array_agg(distinct product_id) filter (where variant_id is null), '{}'),
+        coalesce(array_agg(distinct variant_id) filter (where variant_id is not null), '{}')
+    into v_product_ids, v_variant_ids
+    from public.stock_reservation_items
+    where reservation_id = any(p_reservation_ids);
+
+    perform public.lock_stock_rows(v_product_ids, v_variant_ids);
+
+    update public.products p
+    set stock_quantity = coalesce(p.stock_quantity, 0) + restored.quantity
+    from (
+        select product_id, sum(quantity) as quantity
+        from public.stock_reservation_items
+        where reservation_id = any(p_reservation_ids) and variant_id is null
+        group by product_id
+    ) as restored
+    where p.id = restored.product_id;
+
+    update public.product_variants v
+    set stock_quantity = v.stock_quantity + restored.quantity
+    from (
+        select variant_id, sum(quantity) as quantity
+        from public.stock_reservation_items
+        where reservation_id = any(p_reservation_ids) and variant_id is not null
+        group by variant_id
+    ) as restored
+    where v.id = restored.variant_id;
+
+    return public.stock_levels(v_product_ids, v_variant_ids);
+end;
+$$;
+
+create or replace function public.commit_stock_reservation(p_reservation_id uuid, p_cart_id text)
+returns boolean
+language plpgsql
+as $$
+begin
+    update public.stock_reservations
+    set status = 'committed', closed_at = now()
+    where id = p_reservation_id and cart_id = p_cart_id and status = 'active' and expires_at > now();
+    return found;
+end;
+$$;
+
+create or replace function public.release_stock_reservation(p_reservation_id uuid, p_cart_id text)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_id uuid;
+begin
+    update public.stock_reservations
+    set status = 'released', closed_at = now()
+    where id = p_reservation_id and cart_id = p_cart_id and status = 'active'
+    returning id into v_id;
+
+    if v_id is null then
+        return null;
+    end if;
+
+    return jsonb_build_object('stock', public.restore_reserved_stock(array[v_id]));
+end;
+$$;
+
+create or replace function public.expire_stock_reservations(p_limit integer default 1000)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_ids uuid[];
+begin
+    with expired as (
+        update public.stock_reservations r
+        set status = 'expired', closed_at = now()
+        where r.id in (
+            select id from public.stock_reservations
+            where status = 'active' and expires_at <= now()
+            order by expires_at
+            limit p_limit
+            for update skip locked
+        )
+        returning r.id
+    )
+    select coalesce(array_agg(id), '{}') into v_ids from expired;
+
+    delete from public.stock_reservations
+    where id in (
+        select id from public.stock_reservations
+        where status <> 'active' and closed_at < now() - interval '7 days'
+        limit p_limit
+    );
+
+    return jsonb_build_object(
+        'expired', cardinality(v_ids),
+        'stock', public.restore_reserved_stock(v_ids)
+    );
+end;
+$$;
+
+do $$
+begin
+    if exists (select 1 from pg_extension where extname = 'pg_cron') then
+        perform cron.schedule('expire-stock-reservations', '* * * * *', 'select public.expire_stock_reservations()');
+    end if;
+end;
+$$;
@@ -0,0 +1,89 @@
+import logging
+import queue
+import threading
+import time
+
+from app.config import settings
+from app.logging_config import BoundedQueueHandler, BoundedQueueListener
+
+
+def record(level: int, msg: str) -> logging.LogRecord:
+    return logging.makeLogRecord({"levelno": level, "levelname": logging.getLevelName(level), "msg": msg})
+
+
+def queued(log_queue: queue.Queue) -> list[str]:
+    return [item.msg for item in list(log_queue.queue)]
+
+
+def test_drop_new_keeps_reserved_slots_for_warnings():
+    log_queue = queue.Queue(maxsize=4)
+    handler = BoundedQueueHandler(log_queue, "drop_new", soft_limit=2)
+
+    for msg in ("info-1", "info-2", "info-3"):
+        handler.enqueue(record(logging.INFO, msg))
+    for msg in ("error-1", "error-2", "error-3"):
+        handler.enqueue(record(logging.ERROR, msg))
+
+    assert queued(log_queue) == ["info-1", "info-2", "error-1", "error-2"]
+
+
+def test_drop_oldest_evicts_info_but_never_errors():
+    log_queue = queue.Queue(maxsize=4)
+    handler = BoundedQueueHandler(log_queue, "drop_oldest", soft_limit=2)
+
+    handler.enqueue(record(logging.ERROR, "error"))
+    for msg in ("info-1", "info-2", "info-3"):
+        handler.enqueue(record(logging.INFO, msg))
+
+    assert queued(log_queue) == ["error", "info-3"]
+
+
+def test_drop_oldest_drops_incoming_info_when_only_warnings_are_queued():
+    log_queue = queue.Queue(maxsize=4)
+    handler = BoundedQueueHandler(log_queue, "drop_oldest", soft_limit=2)
+
+    handler.enqueue(record(logging.WARNING, "warning"))
+    handler.enqueue(record(logging.ERROR, "error"))
+    handler.enqueue(record(logging.INFO, "info"))
+
+    assert queued(log_queue) == ["warning", "error"]
+
+
+def test_eviction_keeps_task_accounting_consistent():
+    log_queue = queue.Queue(maxsize=4)
+    handler = BoundedQueueHandler(log_queue, "drop_oldest", soft_limit=2)
+
+    for i in range(10):
+        handler.enqueue(record(logging.INFO, f"info-{i}"))
+
+    assert log_queue.unfinished_tasks == log_queue.qsize() == 2
+    while not log_queue.empty():
+        log_queue.get_nowait()
+        log_queue.task_done()
+    log_queue.join()
+
+
+def test_listener_stop_gives_up_on_a_full_queue(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_FLUSH_TIMEOUT_SECONDS", 0.2)
+    release = threading.Event()
+
+    class BlockingHandler(logging.Handler):
+        def emit(self, record):
+            release.wait()
+
+    log_queue = queue.Queue(maxsize=2)
+    listener = BoundedQueueListener(log_queue, BlockingHandler())
+    listener.start()
+    thread = listener._thread
+    for i in range(3):
+        log_queue.put(record(logging.ERROR, f"error-{i}"))
+
+    started = time.monotonic()
+    listener.stop()
+    elapsed = time.monotonic() - started
+
+    release.set()
+    log_queue.put(listener._sentinel)
+    thread.join(1)
+    assert elapsed < 1
+    assert not thread.is_alive()
@@ -0,0 +1,147 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import reservations
+from app.config import settings
+
+
+class FakeRpc:
+    def __init__(self, respond):
+        self.respond = respond
+        self.batches: list[list[dict]] = []
+        self.gate: asyncio.Event | None = None
+
+    def rpc(self, name, params):
+        assert name == "reserve_stock_batch"
+        return params["p_requests"]
+
+    async def execute(self, requests):
+        self.batches.append(requests)
+        await asyncio.sleep(0)
+        if self.gate is not None:
+            await self.gate.wait()
+        return SimpleNamespace(data=self.respond(requests))
+
+
+def reserved(requests):
+    return {
+        "results": [{"reserved": True, "id": request["cart_id"], "expires_at": "2026-01-01T00:00:00+00:00"} for request in requests],
+        "stock": {"products": [], "variants": []},
+    }
+
+
+@pytest.fixture
+def fake_rpc(monkeypatch):
+    def install(respond=reserved):
+        fake = FakeRpc(respond)
+        monkeypatch.setattr(reservations, "execute", fake.execute)
+        return fake
+    return install
+
+
+async def reserve_many(batcher, fake, count):
+    return await asyncio.gather(
+        *(batcher.reserve({"cart_id": f"cart-{i}"}, fake) for i in range(count)),
+        return_exceptions=True,
+    )
+
+
+def test_concurrent_reservations_share_one_batch_in_order(fake_rpc):
+    fake = fake_rpc()
+    batcher = reservations.ReservationBatcher()
+
+    results = asyncio.run(reserve_many(batcher, fake, 5))
+
+    assert [result["id"] for result in results] == [f"cart-{i}" for i in range(5)]
+    assert [len(batch) for batch in fake.batches] == [5]
+    assert batcher.stats()["largest_batch"] == 5
+    assert batcher.stats()["pending"] == 0
+
+
+def test_batches_are_capped(fake_rpc, monkeypatch):
+    monkeypatch.setattr(settings, "STOCK_RESERVATION_BATCH_MAX", 2)
+    fake = fake_rpc()
+    batcher = reservations.ReservationBatcher()
+
+    results = asyncio.run(reserve_many(batcher, fake, 5))
+
+    assert [result["id"] for result in results] == [f"cart-{i}" for i in range(5)]
+    assert [len(batch) for batch in fake.batches] == [2, 2, 1]
+
+
+def test_upstream_failure_reaches_every_waiter_and_batcher_recovers(fake_rpc):
+    calls = []
+
+    def respond(requests):
+        calls.append(requests)
+        if len(calls) == 1:
+            raise ConnectionError("database unavailable")
+        return reserved(requests)
+
+    fake = fake_rpc(respond)
+    batcher = reservations.ReservationBatcher()
+
+    async def scenario():
+        failed = await reserve_many(batcher, fake, 3)
+        recovered = await batcher.reserve({"cart_id": "later"}, fake)
+        return failed, recovered
+
+    failed, recovered = asyncio.run(scenario())
+
+    assert all(isinstance(result, ConnectionError) for result in failed)
+    assert recovered["id"] == "later"
+
+
+def test_result_count_mismatch_fails_the_batch(fake_rpc):
+    fake = fake_rpc(lambda requests: {"results": reserved(requests)["results"][:-1], "stock": {"products": [], "variants": []}})
+    batcher = reservations.ReservationBatcher()
+
+    results = asyncio.run(reserve_many(batcher, fake, 3))
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_stock_level_failure_does_not_fail_reservations(fake_rpc, monkeypatch):
+    def apply_stock_levels(stock):
+        raise KeyError("products")
+
+    monkeypatch.setattr(reservations, "apply_stock_levels", apply_stock_levels)
+    fake = fake_rpc()
+    batcher = reservations.ReservationBatcher()
+
+    results = asyncio.run(reserve_many(batcher, fake, 2))
+
+    assert [result["id"] for result in results] == ["cart-0", "cart-1"]
+
+
+def test_cancelling_the_drain_cancels_waiters(fake_rpc):
+    fake = fake_rpc()
+    batcher = reservations.ReservationBatcher()
+
+    async def scenario():
+        fake.gate = asyncio.Event()
+        waiters = [asyncio.create_task(batcher.reserve({"cart_id": f"cart-{i}"}, fake)) for i in range(3)]
+        while not fake.batches:
+            await asyncio.sleep(0)
+        waiters.append(asyncio.create_task(batcher.reserve({"cart_id": "queued"}, fake)))
+        await asyncio.sleep(0)
+        batcher._task.cancel()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert batcher.stats()["pending"] == 0
+    assert batcher._task is None
+
+
+def test_rate_limiter_counts_per_key_and_reports_retry_after():
+    limiter = reservations.RateLimiter(limit=2, window=60)
+
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") == 0.0
+    assert 0 < limiter.acquire("a") <= 60
+    assert limiter.acquire("b") == 0.0
+    assert limiter.rejected == 1
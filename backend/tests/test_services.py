@@ -0,0 +1,17 @@
+import pytest
+from fastapi import HTTPException
+
+from app import services
+
+
+@pytest.mark.parametrize("offset", [0, 1, 20, 9223372036854775807])
+def test_cursor_round_trip(offset):
+    assert services.decode_cursor(services.encode_cursor(offset)) == offset
+
+
+@pytest.mark.parametrize("cursor", ["LTU", services.encode_cursor(-1), "!!", "", "YWJj", "_w"])
+def test_decode_cursor_rejects_malformed_and_negative(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        services.decode_cursor(cursor)
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.detail == "Invalid cursor"
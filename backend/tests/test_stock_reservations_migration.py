@@ -0,0 +1,136 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+# Runs the stock reservation migration against a real, disposable Postgres (13+) named by
+# AZHAR_TEST_DATABASE_URL. Each test runs in a transaction that is rolled back afterwards.
+DATABASE_URL = os.environ.get("AZHAR_TEST_DATABASE_URL")
+MIGRATION = Path(__file__).resolve().parents[1] / "supabase" / "migrations" / "20261017000400_stock_reservations.sql"
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="AZHAR_TEST_DATABASE_URL is not set")
+
+BASE_TABLES = """
+create table if not exists public.products (
+    id bigint generated by default as identity primary key,
+    name text not null,
+    price numeric not null default 0,
+    stock_quantity integer not null default 0
+);
+create table if not exists public.product_variants (
+    id bigint generated by default as identity primary key,
+    product_id bigint not null references public.products (id) on delete cascade,
+    name text not null,
+    stock_quantity integer not null default 0
+);
+"""
+
+
+@pytest.fixture
+def cursor():
+    psycopg = pytest.importorskip("psycopg")
+    with psycopg.connect(DATABASE_URL) as connection:
+        try:
+            with connection.cursor() as cur:
+                cur.execute(BASE_TABLES)
+                cur.execute(MIGRATION.read_text())
+                yield cur
+        finally:
+            connection.rollback()
+
+
+def create_product(cur, stock: int) -> int:
+    cur.execute("insert into public.products (name, price, stock_quantity) values ('Smoke', 1, %s) returning id", [stock])
+    return cur.fetchone()[0]
+
+
+def create_variant(cur, product_id: int, stock: int) -> int:
+    cur.execute("insert into public.product_variants (product_id, name, stock_quantity) values (%s, 'Smoke', %s) returning id", [product_id, stock])
+    return cur.fetchone()[0]
+
+
+def stock(cur, table: str, row_id: int) -> int:
+    cur.execute(f"select stock_quantity from public.{table} where id = %s", [row_id])
+    return cur.fetchone()[0]
+
+
+def request(items, cart_id="cart", client_key="client", max_active=5):
+    return {"items": items, "ttl_seconds": 300, "cart_id": cart_id, "client_key": client_key, "max_active": max_active}
+
+
+def reserve(cur, *requests) -> dict:
+    cur.execute("select public.reserve_stock_batch(%s::jsonb)", [json.dumps(list(requests))])
+    return cur.fetchone()[0]
+
+
+def test_batch_reserves_each_request_all_or_nothing(cursor):
+    product_id = create_product(cursor, 5)
+    variant_product_id = create_product(cursor, 0)
+    variant_id = create_variant(cursor, variant_product_id, 2)
+
+    response = reserve(
+        cursor,
+        request([{"product_id": product_id, "variant_id": None, "quantity": 2}, {"product_id": product_id, "variant_id": None, "quantity": 1}], cart_id="a"),
+        request([{"product_id": product_id, "variant_id": None, "quantity": 1}, {"product_id": variant_product_id, "variant_id": variant_id, "quantity": 3}], cart_id="b"),
+        request([{"product_id": variant_product_id, "variant_id": variant_id, "quantity": 2}], cart_id="c"),
+    )
+
+    first, short, variant = response["results"]
+    assert first["reserved"] and variant["reserved"]
+    assert short == {"reserved": False, "shortages": [{"product_id": variant_product_id, "variant_id": variant_id, "requested": 3, "available": 2}]}
+    assert stock(cursor, "products", product_id) == 2
+    assert stock(cursor, "product_variants", variant_id) == 0
+    assert {row["id"]: row["stock_quantity"] for row in response["stock"]["products"]} == {product_id: 2}
+    assert {row["id"]: row["stock_quantity"] for row in response["stock"]["variants"]} == {variant_id: 0}
+
+
+def test_malformed_request_fails_alone(cursor):
+    product_id = create_product(cursor, 5)
+
+    response = reserve(
+        cursor,
+        request([{"product_id": product_id, "variant_id": None, "quantity": "many"}], cart_id="bad"),
+        request([{"product_id": product_id, "variant_id": None, "quantity": 1}], cart_id="good"),
+    )
+
+    bad, good = response["results"]
+    assert bad["reserved"] is False and "error" in bad
+    assert good["reserved"] is True
+    assert stock(cursor, "products", product_id) == 4
+
+
+def test_active_reservations_are_capped_per_client_across_carts(cursor):
+    product_id = create_product(cursor, 10)
+    line = [{"product_id": product_id, "variant_id": None, "quantity": 1}]
+
+    response = reserve(
+        cursor,
+        request(line, cart_id="a", max_active=2),
+        request(line, cart_id="b", max_active=2),
+        request(line, cart_id="c", max_active=2),
+        request(line, cart_id="d", client_key="other", max_active=2),
+    )
+
+    assert [result["reserved"] for result in response["results"]] == [True, True, False, True]
+    assert response["results"][2] == {"reserved": False, "limited": True}
+    assert stock(cursor, "products", product_id) == 7
+
+
+def test_release_and_commit_require_the_owning_cart(cursor):
+    product_id = create_product(cursor, 3)
+    line = [{"product_id": product_id, "variant_id": None, "quantity": 2}]
+    released, committed = (
+        result["id"] for result in reserve(cursor, request(line, cart_id="a"), request([{**line[0], "quantity": 1}], cart_id="b"))["results"]
+    )
+
+    cursor.execute("select public.release_stock_reservation(%s::uuid, 'b')", [released])
+    assert cursor.fetchone()[0] is None
+    cursor.execute("select public.release_stock_reservation(%s::uuid, 'a')", [released])
+    assert cursor.fetchone()[0]["stock"]["products"] == [{"id": product_id, "stock_quantity": 2}]
+
+    cursor.execute("select public.commit_stock_reservation(%s::uuid, 'a')", [committed])
+    assert cursor.fetchone()[0] is False
+    cursor.execute("select public.commit_stock_reservation(%s::uuid, 'b')", [committed])
+    assert cursor.fetchone()[0] is True
+    assert stock(cursor, "products", product_id) == 2